@@ -4,19 +4,46 @@
 Reads ASIN input files, removes duplicates, builds Amazon URLs,
 splits into batches, and returns JSON to the WinForms client.
 """
+import io
 import json
+import mmap
 import os
 import re
 import sys
-import shutil
 import zipfile
+import struct
+import hashlib
+import threading
+import zlib
+import heapq
+import tempfile
+import sqlite3
+import itertools
 import traceback
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 import random
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Shared helpers live in Engines/Common; frozen builds bundle them.
+if not getattr(sys, "frozen", False):
+    _COMMON_DIR = str(Path(__file__).resolve().parent.parent / "Common")
+    if _COMMON_DIR not in sys.path:
+        sys.path.append(_COMMON_DIR)
+
+from engine_support import (
+    ProgressReporter, progress_scope, set_progress_bytes_source,
+    profile_count,
+    profile_phase,
+    profile_scope,
+)
+from xlsx_rows import open_xlsx_rows
 
 DEFAULT_BATCHES = 30
 DEFAULT_MARKET = "US"
+DEFAULT_WRITE_WORKERS = 1
 MARKETS = ["MX", "US"]
 ORDER_CHOICES = ["Ordenado", "Inverso", "Aleatorio"]
 
@@ -26,6 +53,46 @@ ALL_STORES = STORES_LEFT + STORES_RIGHT
 
 NAME_ALLOWED_RE = re.compile(r"[^a-zA-Z0-9_()+-]")
 
+CACHE_DIR_ENV_VAR = "ASIN_BATCHER_CACHE_DIR"
+HISTORY_PATH_ENV_VAR = "ASIN_BATCHER_HISTORY_PATH"
+HISTORY_DB_NAME = "asin_history.sqlite3"
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Bump when reader/cleaning rules change so stale parses are not reused.
+CACHE_FORMAT_VERSION = 3
+CACHE_MAGIC = b"S3AC"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Packed ASINs: the value is right-padded with "0" to ASIN_PACK_WIDTH chars,
+# read as base 36 and combined with the original length, so integer order
+# matches string order and 10-char ASINs fit well below 2**63.
+ASIN_PACK_WIDTH = 10
+ASIN_PACK_LENGTHS = ASIN_PACK_WIDTH + 1
+BASE36_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# External sort: packed values are read and written in chunks of this many
+# items; in-memory parsing is estimated at PARSE_MEMORY_FACTOR x file size.
+EXTERNAL_CHUNK_ITEMS = 64 * 1024
+EXTERNAL_BYTES_PER_ITEM = 24
+PARSE_MEMORY_FACTOR = 3
+
+# Batched cleaning: raw values are joined and cleaned CLEAN_CHUNK_ITEMS at a
+# time; with ``strict_asins`` only ASIN_LENGTH-char values are kept.
+CLEAN_CHUNK_ITEMS = 64 * 1024
+ASIN_LENGTH = 10
+
+# Plain txt fast path: the file is scanned through mmap in windows of this
+# many bytes, cut at line ends.
+PLAIN_SCAN_BYTES = 8 * 1024 * 1024
+# Lowercase maps to uppercase and every line separator to "\n"; anything
+# else that clean_asin would drop is deleted.
+_PLAIN_LINE_BREAKS = b"\r\x0b\x0c\x1c\x1d\x1e"
+_PLAIN_TABLE = bytes.maketrans(
+    b"abcdefghijklmnopqrstuvwxyz" + _PLAIN_LINE_BREAKS,
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZ" + b"\n" * len(_PLAIN_LINE_BREAKS),
+)
+_PLAIN_KEEP = b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz\n" + _PLAIN_LINE_BREAKS
+_PLAIN_DELETE = bytes(b for b in range(256) if b not in _PLAIN_KEEP)
+
 
 def _app_dir():
     return Path(getattr(sys, "_MEIPASS", Path(__file__).resolve().parent))
@@ -42,13 +109,58 @@ def _reset_cwd():
         pass
 
 
-def _purge_numpy_pandas_modules():
-    to_del = [m for m in list(sys.modules) if m.startswith("numpy") or m.startswith("pandas")]
-    for m in to_del:
-        try:
-            del sys.modules[m]
-        except Exception:
-            pass
+SHADOWABLE_PACKAGES = ("numpy", "pandas")
+
+# name -> (module, resolved package folder) for modules already checked.
+_MODULE_ORIGINS = {}
+
+
+def _package_folder(module):
+    cached = _MODULE_ORIGINS.get(module.__name__)
+    if cached is not None and cached[0] is module:
+        return cached[1]
+    origin = getattr(module, "__file__", None)
+    try:
+        folder = Path(origin).resolve().parent if origin else None
+    except Exception:
+        folder = None
+    _MODULE_ORIGINS[module.__name__] = (module, folder)
+    return folder
+
+
+def _is_shadowed(module, selected_dir):
+    """True if module comes from a stray folder instead of an installation.
+
+    Real numpy/pandas are regular packages, so a namespace package (a bare
+    ``numpy`` folder) or one living next to the selected input is rejected.
+    """
+    folder = _package_folder(module)
+    if folder is None:
+        return True
+    if selected_dir is None:
+        return False
+    try:
+        return folder.parent == selected_dir.resolve()
+    except Exception:
+        return False
+
+
+def _purge_shadowed_modules(selected_dir):
+    """Drop numpy/pandas only when they were imported from a stray folder.
+
+    Properly installed modules stay in sys.modules, so repeated reads in a
+    long-lived process reuse them instead of importing them again.
+    """
+    for name in SHADOWABLE_PACKAGES:
+        module = sys.modules.get(name)
+        if module is None or not _is_shadowed(module, selected_dir):
+            continue
+        for m in [m for m in list(sys.modules) if m == name or m.startswith(name + ".")]:
+            try:
+                del sys.modules[m]
+            except Exception:
+                pass
+        _MODULE_ORIGINS.pop(name, None)
 
 
 def _strip_suspicious_paths(selected_dir):
@@ -74,8 +186,47 @@ def sanitize_for_read(selected_path):
     os.environ.setdefault("PANDAS_IGNORE_CLIPBOARD", "1")
     p = Path(selected_path)
     selected_dir = p.parent if p.exists() else None
-    _purge_numpy_pandas_modules()
     _strip_suspicious_paths(selected_dir)
+    _purge_shadowed_modules(selected_dir)
+
+
+_READ = threading.local()
+
+
+@contextmanager
+def rejected_scope(strict=None):
+    """Collect rejected-value counts by reason from readers run inside.
+
+    Scopes nest: inner counts are also added to the enclosing scope.
+    ``strict`` (when given) turns on length validation for the block.
+    """
+    previous = getattr(_READ, "rejected", None)
+    previous_strict = getattr(_READ, "strict", False)
+    totals = {}
+    _READ.rejected = totals
+    if strict is not None:
+        _READ.strict = bool(strict)
+    try:
+        yield totals
+    finally:
+        _READ.rejected = previous
+        _READ.strict = previous_strict
+        if previous is not None:
+            for reason, n in totals.items():
+                previous[reason] = previous.get(reason, 0) + n
+
+
+def strict_asins():
+    return getattr(_READ, "strict", False)
+
+
+def count_rejected(rejected):
+    totals = getattr(_READ, "rejected", None)
+    if totals is None:
+        return
+    for reason, n in rejected.items():
+        if n:
+            totals[reason] = totals.get(reason, 0) + n
 
 
 def clean_asin(s):
@@ -83,6 +234,53 @@ def clean_asin(s):
     return re.sub(r"[^A-Z0-9]", "", s)
 
 
+ASIN_JUNK_RE = re.compile(r"[^A-Z0-9\n]")
+
+
+def clean_asins(values, strict=False):
+    """Clean a chunk of raw values at once; returns (asins, rejected).
+
+    Same rules as clean_asin, applied with one upper() and one regex pass
+    over the joined chunk. ``rejected`` counts dropped values by reason:
+    ``empty`` (nothing left after cleaning) and, when ``strict``,
+    ``length`` (not ASIN_LENGTH chars).
+    """
+    if not values:
+        return [], {}
+    values = ["" if v is None else str(v) for v in values]
+    text = "\n".join(values).upper()
+    if text.count("\n") != len(values) - 1:
+        # A value spans lines; joining would split it.
+        cleaned = [clean_asin(v) for v in values]
+    else:
+        cleaned = ASIN_JUNK_RE.sub("", text).split("\n")
+    asins = [v for v in cleaned if v]
+    rejected = {"empty": len(cleaned) - len(asins)}
+    if strict:
+        valid = [v for v in asins if len(v) == ASIN_LENGTH]
+        rejected["length"] = len(asins) - len(valid)
+        asins = valid
+    return asins, {k: n for k, n in rejected.items() if n}
+
+
+def iter_clean_asins(values):
+    """Yield cleaned ASINs from raw values, cleaning them in chunks."""
+    strict = strict_asins()
+    for chunk in _chunked(values, CLEAN_CHUNK_ITEMS):
+        asins, rejected = clean_asins(chunk, strict)
+        count_rejected(rejected)
+        yield from asins
+
+
+def _chunked(values, size):
+    it = iter(values)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def is_inventory_report(filename):
     base = Path(filename).name
     if re.fullmatch(r"Reporte\+de\+inventario\+\d{2}-\d{2}-\d{4}\.(txt|xlsx|xls)", base, re.IGNORECASE):
@@ -98,108 +296,927 @@ def is_inventory_report(filename):
     return False
 
 
-def read_asins_from_inventory_txt(path):
+INVENTORY_ASIN_RE = re.compile(r"\b[A-Z0-9]{10}\b")
+INVENTORY_LINE_ASIN_RE = re.compile(r"^[^\n]*?\b([A-Z0-9]{10})\b", re.MULTILINE)
+BLANK_LINE_RE = re.compile(r"^[^\S\n]*$", re.MULTILINE)
+
+
+def find_inventory_asins(cells):
+    """Return (asins, rejected) for a chunk of ``asin`` column cells.
+
+    Each cell yields its first ASIN-shaped token; cells without one are
+    counted as ``empty`` or ``invalid``.
+    """
+    if not cells:
+        return [], {}
+    text = "\n".join(cells).upper()
+    if text.count("\n") != len(cells) - 1:
+        asins = []
+        for cell in cells:
+            m = INVENTORY_ASIN_RE.search(cell.strip().upper())
+            if m:
+                asins.append(m.group(0))
+        empty = sum(1 for cell in cells if not cell.strip())
+    else:
+        asins = INVENTORY_LINE_ASIN_RE.findall(text)
+        empty = len(BLANK_LINE_RE.findall(text))
+    rejected = {"empty": empty, "invalid": len(cells) - len(asins) - empty}
+    return asins, {k: n for k, n in rejected.items() if n}
+
+
+def iter_asins_from_inventory_txt(path):
+    """Yield ASINs from a tab-separated inventory report row by row.
+
+    The ``asin`` column is located from the header; without one, every cell
+    is scanned for an ASIN-shaped token.
+    """
     import csv
     p = Path(path)
     if not p.is_file():
-        return []
-
-    rows = []
-    for enc in ("utf-8-sig", "latin-1"):
-        try:
-            with p.open("r", encoding=enc, errors="ignore", newline="") as f:
-                reader = csv.reader(f, delimiter="\t")
-                rows = list(reader)
-            break
-        except Exception:
-            rows = []
-            continue
-    if not rows:
-        return []
-
-    asin_re = re.compile(r"\b[A-Z0-9]{10}\b")
-    header = [c.strip().lower() for c in rows[0]] if rows else []
-    asins = []
-
-    if "asin" in header:
-        idx = header.index("asin")
-        for row in rows[1:]:
-            if idx < len(row):
-                cell = (row[idx] or "").strip().upper()
-                m = asin_re.search(cell)
-                if m:
-                    asins.append(clean_asin(m.group(0)))
-    else:
-        for row in rows:
+        return
+
+    with p.open("rb") as raw, io.TextIOWrapper(raw, encoding="utf-8-sig", errors="ignore", newline="") as f:
+        set_progress_bytes_source(raw.tell)
+        reader = csv.reader(f, delimiter="\t")
+        first = next(reader, None)
+        if first is None:
+            return
+        header = [c.strip().lower() for c in first]
+
+        if "asin" in header:
+            idx = header.index("asin")
+            cells = (row[idx] or "" for row in reader if idx < len(row))
+            for chunk in _chunked(cells, CLEAN_CHUNK_ITEMS):
+                asins, rejected = find_inventory_asins(chunk)
+                count_rejected(rejected)
+                yield from asins
+            return
+
+        for row in itertools.chain([first], reader):
             for cell in row:
-                m = asin_re.search(str(cell).strip().upper())
+                m = INVENTORY_ASIN_RE.search(str(cell).strip().upper())
                 if m:
-                    asins.append(clean_asin(m.group(0)))
+                    yield m.group(0)
 
-    return [a for a in asins if a]
 
+def read_asins_from_inventory_txt(path):
+    return list(iter_asins_from_inventory_txt(path))
 
-def read_asins_from_inventory_excel(path):
-    import pandas as pd
+
+def _iter_asins_from_excel_pandas(path, asin_column):
+    with profile_phase("import"):
+        import pandas as pd
     df = pd.read_excel(path, dtype=str, engine="openpyxl")
-    cols = [c.strip().lower() for c in df.columns]
-    if "asin" not in cols:
-        vals = [clean_asin(x or "") for x in df.iloc[:, 0].fillna("").tolist()]
-        return [v for v in vals if v]
-    asin_col = df.columns[cols.index("asin")]
-    vals = [clean_asin(x or "") for x in df[asin_col].fillna("").tolist()]
-    return [v for v in vals if v]
+    cols = [str(c).strip().lower() for c in df.columns]
+    if asin_column and "asin" in cols:
+        values = df[df.columns[cols.index("asin")]]
+    else:
+        values = df.iloc[:, 0]
+    yield from iter_clean_asins(values.fillna("").tolist())
+
+
+def _iter_asins_from_rows(rows, asin_column):
+    header = next(rows, None)
+    if header is None:
+        return
+    idx = 0
+    if asin_column:
+        cols = ["" if c is None else str(c).strip().lower() for c in header]
+        if "asin" in cols:
+            idx = cols.index("asin")
+    yield from iter_clean_asins(
+        row[idx] for row in rows if idx < len(row) and row[idx] is not None
+    )
+
+
+def iter_asins_from_excel(path, asin_column=True):
+    """Yield ASINs from the first sheet of an xlsx file.
+
+    Rows are streamed straight from the sheet XML and only one column is
+    read: ``asin`` when ``asin_column`` is set and the header has it,
+    otherwise the first column. Workbooks the direct reader cannot open go
+    through openpyxl in read-only mode, and pandas is used only if openpyxl
+    is missing.
+    """
+    try:
+        rows = open_xlsx_rows(path, first_sheet_only=True)
+    except Exception:
+        rows = None
+    if rows is not None:
+        yield from _iter_asins_from_rows(rows, asin_column)
+        return
+
+    try:
+        with profile_phase("import"):
+            from openpyxl import load_workbook
+    except Exception:
+        yield from _iter_asins_from_excel_pandas(path, asin_column)
+        return
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from _iter_asins_from_rows(wb.worksheets[0].iter_rows(values_only=True), asin_column)
+    finally:
+        wb.close()
+
+
+def read_asins_from_inventory_excel(path):
+    return list(iter_asins_from_excel(path))
+
+
+def _ignore_read_errors(asins):
+    try:
+        yield from asins
+    except Exception:
+        return
+
+
+def iter_asins_from_plain_txt(path):
+    """Yield cleaned ASINs of a plain list, reading the file line by line."""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        yield from iter_clean_asins(part for line in f for part in line.splitlines())
 
 
 def read_asins_from_plain_txt(path):
-    lines = Path(path).read_text(encoding="utf-8", errors="ignore").splitlines()
-    vals = [clean_asin(x) for x in lines]
-    return [v for v in vals if v]
+    return list(iter_asins_from_plain_txt(path))
 
 
-def extract_asins_any(path):
-    """Read ASINs from txt/xlsx and return (unique, duplicates)."""
-    sanitize_for_read(path)
+def iter_asins_any(path):
+    """Yield cleaned ASINs from txt/xlsx in file order."""
     p = Path(path)
     ext = p.suffix.lower()
-    asins = []
 
     if ext in [".xlsx", ".xls"]:
         if is_inventory_report(path):
-            asins = read_asins_from_inventory_excel(path)
-        else:
-            try:
-                import pandas as pd
-                df = pd.read_excel(path, dtype=str, engine="openpyxl")
-                vals = [clean_asin(x or "") for x in df.iloc[:, 0].fillna("").tolist()]
-                asins = [v for v in vals if v]
-            except Exception:
-                asins = []
-    elif ext == ".txt":
+            return iter_asins_from_excel(path)
+        return _ignore_read_errors(iter_asins_from_excel(path, asin_column=False))
+    if ext == ".txt":
         if is_inventory_report(path):
-            asins = read_asins_from_inventory_txt(path)
-        else:
-            asins = read_asins_from_plain_txt(path)
+            return iter_asins_from_inventory_txt(path)
+        return iter_asins_from_plain_txt(path)
+    return _ignore_read_errors(iter_asins_from_plain_txt(path))
+
+
+def _numpy():
+    try:
+        with profile_phase("import"):
+            import numpy as np
+    except Exception:
+        return None
+    return np
+
+
+def pack_asin(asin):
+    """Pack a cleaned ASIN of up to 10 chars into an order-preserving int."""
+    return int(asin.ljust(ASIN_PACK_WIDTH, "0"), 36) * ASIN_PACK_LENGTHS + len(asin)
+
+
+def unpack_asin(value):
+    length = value % ASIN_PACK_LENGTHS
+    n = value // ASIN_PACK_LENGTHS
+    chars = []
+    for _ in range(ASIN_PACK_WIDTH):
+        n, r = divmod(n, 36)
+        chars.append(BASE36_DIGITS[r])
+    return "".join(reversed(chars))[:length]
+
+
+def unpack_asins(values):
+    """Decode packed ASINs back to strings; str lists pass through."""
+    if isinstance(values, PackedAsinFile):
+        values = values.to_array()
+    if not isinstance(values, array):
+        return values
+    np = _numpy()
+    if np is None or not values:
+        return [unpack_asin(v) for v in values]
+    v = np.frombuffer(values, dtype=np.uint64)
+    lengths = (v % ASIN_PACK_LENGTHS).tolist()
+    n = v // ASIN_PACK_LENGTHS
+    digits = np.empty((len(v), ASIN_PACK_WIDTH), dtype=np.uint8)
+    for col in range(ASIN_PACK_WIDTH - 1, -1, -1):
+        digits[:, col] = n % 36
+        n //= 36
+    table = np.frombuffer(BASE36_DIGITS.encode("ascii"), dtype=np.uint8)
+    raw = table[digits].view(f"S{ASIN_PACK_WIDTH}").ravel().tolist()
+    return [r[:length].decode("ascii") for r, length in zip(raw, lengths)]
+
+
+def pack_asins(asins):
+    """Pack an ASIN stream into array('Q').
+
+    Returns a list of strings instead if any value is too long to pack.
+    """
+    packed = array("Q")
+    append = packed.append
+    it = iter(asins)
+    for a in it:
+        if len(a) > ASIN_PACK_WIDTH:
+            rest = unpack_asins(packed)
+            rest.append(a)
+            rest.extend(it)
+            return rest
+        append(pack_asin(a))
+    return packed
+
+
+def _iter_plain_windows(mm, size, window=PLAIN_SCAN_BYTES):
+    # Yields (cleaned window, raw bytes); every window ends at a line end and
+    # its cleaned form holds only [A-Z0-9] lines each closed by "\n".
+    start = 0
+    while start < size:
+        end = min(start + window, size)
+        if end < size:
+            cut = max(mm.rfind(b"\n", start, end), mm.rfind(b"\r", start, end))
+            if cut < 0:
+                cut = mm.find(b"\n", end)
+                if cut < 0:
+                    cut = size - 1
+            if mm[cut:cut + 2] == b"\r\n":
+                cut += 1
+            end = cut + 1
+        cleaned = mm[start:end].replace(b"\r\n", b"\n").translate(_PLAIN_TABLE, _PLAIN_DELETE)
+        if not cleaned.endswith(b"\n"):
+            cleaned += b"\n"
+        yield cleaned, end - start
+        start = end
+
+
+def _pack_plain_window(cleaned, np, strict, rejected):
+    # Returns None when a value is too long to pack (and not strict).
+    if np is None:
+        packed = array("Q")
+        for v in cleaned[:-1].split(b"\n"):
+            if not v:
+                rejected["empty"] = rejected.get("empty", 0) + 1
+            elif strict and len(v) != ASIN_LENGTH:
+                rejected["length"] = rejected.get("length", 0) + 1
+            elif len(v) > ASIN_PACK_WIDTH:
+                return None
+            else:
+                packed.append(int(v.ljust(ASIN_PACK_WIDTH, b"0"), 36) * ASIN_PACK_LENGTHS + len(v))
+        return packed
+    raw = np.frombuffer(cleaned, dtype=np.uint8)
+    ends = np.flatnonzero(raw == 10)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts
+    keep = lengths > 0
+    rejected["empty"] = rejected.get("empty", 0) + int(len(keep) - keep.sum())
+    if strict:
+        valid = lengths == ASIN_LENGTH
+        rejected["length"] = rejected.get("length", 0) + int((keep & ~valid).sum())
+        keep &= valid
+    starts, lengths = starts[keep], lengths[keep]
+    if len(lengths) and lengths.max() > ASIN_PACK_WIDTH:
+        return None
+    table = _base36_table(np)
+    last = len(raw) - 1
+    values = np.zeros(len(starts), dtype=np.uint64)
+    for k in range(ASIN_PACK_WIDTH):
+        # Only the k-th byte of each ASIN is looked up (uint8); positions
+        # past an ASIN's length are the "0" padding, worth 0.
+        d = table[raw[np.minimum(starts + k, last)]]
+        d[k >= lengths] = 0
+        values *= np.uint64(36)
+        values += d
+    values = values * np.uint64(ASIN_PACK_LENGTHS) + lengths.astype(np.uint64)
+    return array("Q", values.tobytes())
+
+
+_BASE36_TABLE = []
+
+
+def _base36_table(np):
+    if not _BASE36_TABLE:
+        table = np.zeros(256, dtype=np.uint8)
+        for value, char in enumerate(BASE36_DIGITS):
+            table[ord(char)] = value
+        _BASE36_TABLE.append(table)
+    return _BASE36_TABLE[0]
+
+
+def iter_packed_plain_chunks(path, progress=None, window=PLAIN_SCAN_BYTES):
+    """Yield packed ASINs of a plain ASIN list in file order, one array per
+    scan window of about ``window`` bytes.
+
+    Raises AsinPackError if a value is too long to pack; rejected values
+    are counted once the whole file has been scanned.
+    """
+    size = Path(path).stat().st_size
+    if size == 0:
+        return
+    np = _numpy()
+    strict = strict_asins()
+    rejected = {}
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for cleaned, nbytes in _iter_plain_windows(mm, size, window):
+            chunk = _pack_plain_window(cleaned, np, strict, rejected)
+            if chunk is None:
+                raise AsinPackError(f"ASIN too long to pack in: {path}")
+            if progress is not None:
+                progress.add(len(chunk), nbytes)
+            yield chunk
+    count_rejected(rejected)
+
+
+def read_packed_asins_from_plain_txt(path, progress=None):
+    """Scan a plain ASIN list as bytes and return packed ASINs in file order.
+
+    Same cleaning as read_asins_from_plain_txt, but the file is memory-mapped
+    and normalised with bytes.translate, so no str is built per line.
+    Returns None if a value is too long to pack.
+    """
+    packed = array("Q")
+    try:
+        for chunk in iter_packed_plain_chunks(path, progress):
+            packed.extend(chunk)
+    except AsinPackError:
+        return None
+    return packed
+
+
+def _is_plain_txt(path):
+    ext = Path(path).suffix.lower()
+    if ext in (".xlsx", ".xls"):
+        return False
+    return ext != ".txt" or not is_inventory_report(path)
+
+
+def sort_unique_asins(values):
+    """Return (uniques, dups) in ascending order.
+
+    ``dups`` holds one entry per repeated occurrence. Packed input is sorted
+    with NumPy when available; both results keep the input representation.
+    """
+    if isinstance(values, array):
+        np = _numpy()
+        if np is not None:
+            uniq, counts = np.unique(np.frombuffer(values, dtype=np.uint64), return_counts=True)
+            dups = np.repeat(uniq, counts - 1)
+            return array("Q", uniq.tobytes()), array("Q", dups.tobytes())
+        uniques, dups = array("Q"), array("Q")
     else:
+        uniques, dups = [], []
+    prev = None
+    for v in sorted(values):
+        if v == prev:
+            dups.append(v)
+        else:
+            uniques.append(v)
+            prev = v
+    return uniques, dups
+
+
+def extract_asins_any(path):
+    """Read ASINs from txt/xlsx and return sorted (unique, duplicates).
+
+    ASINs are kept packed in array('Q') unless a value is longer than 10
+    chars; use unpack_asins() to get strings back.
+    """
+    sanitize_for_read(path)
+    size = Path(path).stat().st_size
+    progress = ProgressReporter("read", size)
+    with profile_phase("read"):
+        asins = read_packed_asins_from_plain_txt(path, progress) if _is_plain_txt(path) else None
+        if asins is None:
+            progress = ProgressReporter("read", size)
+            asins = pack_asins(progress.track(iter_asins_any(path)))
+    progress.finish()
+    profile_count("input_bytes", size)
+    profile_count("input_rows", len(asins))
+    with profile_phase("dedup"):
+        return sort_unique_asins(asins)
+
+
+class AsinPackError(ValueError):
+    pass
+
+
+class PackedAsinFile:
+    """Read-only sequence of packed ASINs stored as array('Q') bytes on disk.
+
+    Supports len(), iteration, contiguous slices and ``[::-1]``; slices are
+    lazy views, and to_array() loads a view into memory.
+    """
+
+    def __init__(self, path, run_items=EXTERNAL_CHUNK_ITEMS, reverse=False, start=0, stop=None):
+        self.path = Path(path)
+        self.run_items = run_items
+        self.reverse = reverse
+        self.start = start
+        self.stop = self.path.stat().st_size // 8 if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError("PackedAsinFile supports slices only")
+        if key.step == -1 and key.start is None and key.stop is None:
+            return PackedAsinFile(self.path, self.run_items, not self.reverse, self.start, self.stop)
+        first, last, step = key.indices(len(self))
+        if step != 1:
+            raise ValueError("PackedAsinFile slices must be contiguous")
+        last = max(first, last)
+        if self.reverse:
+            return PackedAsinFile(self.path, self.run_items, True, self.stop - last, self.stop - first)
+        return PackedAsinFile(self.path, self.run_items, False, self.start + first, self.start + last)
+
+    def __iter__(self):
+        for first in range(0, len(self), EXTERNAL_CHUNK_ITEMS):
+            yield from self[first:first + EXTERNAL_CHUNK_ITEMS].to_array()
+
+    def to_array(self):
+        values = array("Q")
+        if len(self) <= 0:
+            return values
+        with self.path.open("rb") as f:
+            f.seek(self.start * 8)
+            values.fromfile(f, len(self))
+        if self.reverse:
+            values.reverse()
+        return values
+
+    def shuffled(self):
+        """Return a randomly permuted copy without loading every value.
+
+        Values are scattered into random buckets of about ``run_items`` each,
+        and every bucket is shuffled in memory before concatenation.
+        """
+        n_buckets = max(1, -(-len(self) // self.run_items))
+        bucket_paths = [self.path.with_name(f"{self.path.stem}_bucket_{i}.bin") for i in range(n_buckets)]
+        np = _numpy()
+        files = [p.open("wb") for p in bucket_paths]
         try:
-            asins = read_asins_from_plain_txt(path)
-        except Exception:
-            asins = []
+            for first in range(0, len(self), EXTERNAL_CHUNK_ITEMS):
+                chunk = self[first:first + EXTERNAL_CHUNK_ITEMS].to_array()
+                if np is not None:
+                    values = np.frombuffer(chunk, dtype=np.uint64)
+                    ids = np.random.randint(0, n_buckets, size=len(values))
+                    for i, f in enumerate(files):
+                        f.write(values[ids == i].tobytes())
+                    continue
+                buckets = [array("Q") for _ in files]
+                for v in chunk:
+                    buckets[random.randrange(n_buckets)].append(v)
+                for bucket, f in zip(buckets, files):
+                    bucket.tofile(f)
+        finally:
+            for f in files:
+                f.close()
+
+        out_path = self.path.with_name(f"{self.path.stem}_shuffled.bin")
+        with out_path.open("wb") as out:
+            for bucket_path in bucket_paths:
+                bucket = array("Q")
+                with bucket_path.open("rb") as f:
+                    bucket.frombytes(f.read())
+                random.shuffle(bucket)
+                bucket.tofile(out)
+                bucket_path.unlink()
+        return PackedAsinFile(out_path, self.run_items)
+
+
+def _packed_temp_file(folder):
+    fd, name = tempfile.mkstemp(suffix=".bin", dir=str(folder))
+    return os.fdopen(fd, "wb"), Path(name)
+
+
+def iter_asin_chunks(values, size=EXTERNAL_CHUNK_ITEMS):
+    """Yield ASIN strings in chunks from any ASIN representation."""
+    for start in range(0, len(values), size):
+        yield unpack_asins(values[start:start + size])
+
+
+def _write_sorted_run(values, path):
+    np = _numpy()
+    if np is not None:
+        data = np.sort(np.frombuffer(values, dtype=np.uint64)).tobytes()
+    else:
+        data = array("Q", sorted(values)).tobytes()
+    Path(path).write_bytes(data)
+    return Path(path)
 
-    uniques, dups, seen = [], [], set()
+
+def _spill_sorted_runs(asins, folder, run_items):
+    runs = []
+    buf = array("Q")
     for a in asins:
-        if a in seen:
-            dups.append(a)
-        else:
-            seen.add(a)
-            uniques.append(a)
+        if len(a) > ASIN_PACK_WIDTH:
+            raise AsinPackError(f"ASIN too long to pack: {a}")
+        buf.append(pack_asin(a))
+        if len(buf) >= run_items:
+            runs.append(_write_sorted_run(buf, Path(folder) / f"run_{len(runs)}.bin"))
+            buf = array("Q")
+    if buf or not runs:
+        runs.append(_write_sorted_run(buf, Path(folder) / f"run_{len(runs)}.bin"))
+    return runs
+
+
+def _spill_packed_runs(chunks, folder, run_items):
+    # Same as _spill_sorted_runs for a stream of already packed arrays.
+    runs = []
+    buf = array("Q")
+    for chunk in chunks:
+        start = 0
+        while start < len(chunk):
+            take = min(run_items - len(buf), len(chunk) - start)
+            buf.extend(chunk[start:start + take])
+            start += take
+            if len(buf) >= run_items:
+                runs.append(_write_sorted_run(buf, Path(folder) / f"run_{len(runs)}.bin"))
+                buf = array("Q")
+    if buf or not runs:
+        runs.append(_write_sorted_run(buf, Path(folder) / f"run_{len(runs)}.bin"))
+    return runs
+
+
+def external_sort_unique(asins, folder, run_items, packed=False):
+    """Sort-merge an ASIN stream through temp files in folder.
+
+    Sorted runs of at most run_items values are spilled to disk and k-way
+    merged into unique and duplicate files, returned as PackedAsinFile.
+    With ``packed`` the stream yields array('Q') chunks instead of strings.
+    """
+    with profile_phase("read"):
+        spill = _spill_packed_runs if packed else _spill_sorted_runs
+        runs = spill(asins, folder, run_items)
+    with profile_phase("dedup"):
+        return _merge_sorted_runs(runs, folder, run_items)
+
+
+def _merge_sorted_runs(runs, folder, run_items):
+    uniques_path = Path(folder) / "uniques.bin"
+    dups_path = Path(folder) / "dups.bin"
+    merged = heapq.merge(*(PackedAsinFile(r) for r in runs)) if len(runs) > 1 else PackedAsinFile(runs[0])
+    with uniques_path.open("wb") as uf, dups_path.open("wb") as df:
+        ubuf, dbuf = array("Q"), array("Q")
+        prev = None
+        for v in merged:
+            if v == prev:
+                dbuf.append(v)
+                if len(dbuf) >= EXTERNAL_CHUNK_ITEMS:
+                    dbuf.tofile(df)
+                    dbuf = array("Q")
+            else:
+                prev = v
+                ubuf.append(v)
+                if len(ubuf) >= EXTERNAL_CHUNK_ITEMS:
+                    ubuf.tofile(uf)
+                    ubuf = array("Q")
+        ubuf.tofile(uf)
+        dbuf.tofile(df)
+    for r in runs:
+        r.unlink()
+    return PackedAsinFile(uniques_path, run_items), PackedAsinFile(dups_path, run_items)
+
+
+def extract_asins_external(path, folder, memory_limit_mb):
+    """Like extract_asins_any, but holds at most ~memory_limit_mb of ASINs."""
+    sanitize_for_read(path)
+    run_items = max(EXTERNAL_CHUNK_ITEMS, memory_limit_mb * 1024 * 1024 // EXTERNAL_BYTES_PER_ITEM)
+    size = Path(path).stat().st_size
+    progress = ProgressReporter("read", size)
+    if _is_plain_txt(path):
+        # Windows of about one run's worth of lines keep the scan itself
+        # within the limit.
+        chunks = iter_packed_plain_chunks(path, progress, min(PLAIN_SCAN_BYTES, run_items * ASIN_PACK_LENGTHS))
+        result = external_sort_unique(chunks, folder, run_items, packed=True)
+    else:
+        result = external_sort_unique(progress.track(iter_asins_any(path)), folder, run_items)
+    progress.finish()
+    profile_count("input_bytes", size)
+    profile_count("input_rows", len(result[0]) + len(result[1]))
+    return result
+
+
+def _local_data_dir():
+    local = os.environ.get("LOCALAPPDATA")
+    base = Path(local) if local else Path.home() / ".cache"
+    return base / "S3Integracion"
+
+
+def _cache_dir():
+    override = os.environ.get(CACHE_DIR_ENV_VAR)
+    if override:
+        return Path(override)
+    return _local_data_dir() / "asin_cache"
+
+
+def file_content_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_cache_key(path):
+    """Key a parse by path, size, mtime, content hash and strictness."""
+    p = Path(path).resolve()
+    st = p.stat()
+    ident = (
+        f"{CACHE_FORMAT_VERSION}|{p}|{st.st_size}|{st.st_mtime_ns}|{file_content_hash(p)}"
+        f"|{int(strict_asins())}"
+    )
+    return hashlib.blake2b(ident.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _encode_asin_block(asins):
+    if isinstance(asins, array):
+        return b"Q" + zlib.compress(asins.tobytes(), 1)
+    return b"S" + zlib.compress("\n".join(asins).encode("ascii"), 1)
+
+
+def _decode_asin_block(blob):
+    raw = zlib.decompress(blob[1:])
+    if blob[:1] == b"Q":
+        return array("Q", raw)
+    text = raw.decode("ascii")
+    return text.split("\n") if text else []
+
+
+def read_parse_cache(key):
+    fpath = _cache_dir() / f"{key}.bin"
+    try:
+        data = fpath.read_bytes()
+    except OSError:
+        return None
+    try:
+        if data[:4] != CACHE_MAGIC:
+            return None
+        n_unique, n_dups = struct.unpack_from("<QQ", data, 4)
+        start = 20
+        uniques = _decode_asin_block(data[start:start + n_unique])
+        start += n_unique
+        dups = _decode_asin_block(data[start:start + n_dups])
+        rejected = json.loads(data[start + n_dups:].decode("ascii"))
+    except Exception:
+        return None
+    try:
+        os.utime(fpath)
+    except OSError:
+        pass
+    return uniques, dups, rejected
+
+
+def write_parse_cache(key, uniques, dups, rejected=None, max_bytes=CACHE_MAX_BYTES):
+    folder = _cache_dir()
+    try:
+        folder.mkdir(parents=True, exist_ok=True)
+        ublock = _encode_asin_block(uniques)
+        dblock = _encode_asin_block(dups)
+        payload = (
+            CACHE_MAGIC + struct.pack("<QQ", len(ublock), len(dblock)) + ublock + dblock
+            + json.dumps(rejected or {}).encode("ascii")
+        )
+        if len(payload) > max_bytes:
+            return
+        tmp = folder / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp.write_bytes(payload)
+        os.replace(tmp, folder / f"{key}.bin")
+        evict_parse_cache(max_bytes)
+    except OSError:
+        pass
+
+
+def evict_parse_cache(max_bytes=CACHE_MAX_BYTES):
+    """Delete least recently used cache entries until under max_bytes."""
+    entries = []
+    for fpath in _cache_dir().glob("*.bin"):
+        try:
+            st = fpath.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, fpath))
+    total = sum(size for _, size, _ in entries)
+    for _, size, fpath in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        try:
+            fpath.unlink()
+            total -= size
+        except OSError:
+            pass
+
+
+def extract_asins_cached(path, use_cache=True):
+    """Like extract_asins_any, reusing an earlier parse of the same file."""
+    if not use_cache:
+        return extract_asins_any(path)
+    with profile_phase("cache"):
+        try:
+            key = parse_cache_key(path)
+        except OSError:
+            key = None
+        cached = read_parse_cache(key) if key else None
+    if cached is not None:
+        uniques, dups, rejected = cached
+        count_rejected(rejected)
+        profile_count("input_bytes", Path(path).stat().st_size)
+        profile_count("input_rows", len(uniques) + len(dups))
+        return uniques, dups
+    with rejected_scope() as rejected:
+        uniques, dups = extract_asins_any(path)
+    if key:
+        with profile_phase("cache"):
+            write_parse_cache(key, uniques, dups, rejected)
     return uniques, dups
 
 
-def to_url(asin, market):
+def asin_difference(left, right):
+    """Return the sorted uniques in left that are not in right.
+
+    Both inputs must be ascending. The result keeps left's representation
+    (a PackedAsinFile result is written next to left's file).
+    """
+    if isinstance(left, list) != isinstance(right, list):
+        # String lists (values too long to pack) only compare with strings.
+        left, right = unpack_asins(left), unpack_asins(right)
+    np = _numpy()
+    if np is not None and isinstance(left, array) and isinstance(right, array):
+        diff = np.setdiff1d(
+            np.frombuffer(left, dtype=np.uint64),
+            np.frombuffer(right, dtype=np.uint64),
+            assume_unique=True,
+        )
+        return array("Q", diff.tobytes())
+
+    out_file = None
+    if isinstance(left, PackedAsinFile):
+        out_file, out_path = _packed_temp_file(left.path.parent)
+        kept = array("Q")
+    else:
+        kept = array("Q") if isinstance(left, array) else []
+    try:
+        others = iter(right)
+        nxt = next(others, None)
+        for value in left:
+            while nxt is not None and nxt < value:
+                nxt = next(others, None)
+            if value == nxt:
+                continue
+            kept.append(value)
+            if out_file is not None and len(kept) >= EXTERNAL_CHUNK_ITEMS:
+                kept.tofile(out_file)
+                kept = array("Q")
+        if out_file is not None:
+            kept.tofile(out_file)
+    finally:
+        if out_file is not None:
+            out_file.close()
+    if out_file is not None:
+        return PackedAsinFile(out_path, left.run_items)
+    return kept
+
+
+def _history_path():
+    override = os.environ.get(HISTORY_PATH_ENV_VAR)
+    if override:
+        return Path(override)
+    return _local_data_dir() / HISTORY_DB_NAME
+
+
+def _history_connect():
+    path = _history_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS emitted ("
+        "store TEXT NOT NULL, market TEXT NOT NULL, asin INTEGER NOT NULL, "
+        "last_emitted TEXT NOT NULL, PRIMARY KEY (store, market, asin)) WITHOUT ROWID"
+    )
+    return conn
+
+
+def _history_key(value):
+    # History rows hold packed ASINs; values too long to pack are not tracked.
+    if isinstance(value, str):
+        return pack_asin(value) if len(value) <= ASIN_PACK_WIDTH else None
+    return value
+
+
+def parse_history_since(value):
+    """Return the ISO timestamp a ``skip_seen_since`` value refers to.
+
+    Accepts a number of days back or an ISO date/datetime string.
+    """
+    if value is None or value == "":
+        return ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (datetime.now() - timedelta(days=value)).isoformat(timespec="seconds")
+    text = str(value).strip()
+    if text.isdigit():
+        return (datetime.now() - timedelta(days=int(text))).isoformat(timespec="seconds")
+    return datetime.fromisoformat(text).isoformat(timespec="seconds")
+
+
+def filter_seen_asins(uniques, store, market, since):
+    """Drop ASINs emitted for store/market at or after ``since``.
+
+    Both sides are walked in ascending order (a sorted merge against the
+    history primary key), so no per-ASIN queries are made. Returns
+    (remaining, skipped_count) in the input representation.
+    """
+    conn = _history_connect()
+    try:
+        cur = conn.execute(
+            "SELECT asin FROM emitted WHERE store = ? AND market = ? AND last_emitted >= ? ORDER BY asin",
+            (store, market, since),
+        )
+        seen = (row[0] for row in cur)
+        nxt = next(seen, None)
+        if isinstance(uniques, PackedAsinFile):
+            out_file, out_path = _packed_temp_file(uniques.path.parent)
+            kept = array("Q")
+        else:
+            out_file = None
+            kept = array("Q") if isinstance(uniques, array) else []
+        skipped = 0
+        try:
+            for value in uniques:
+                key = _history_key(value)
+                while nxt is not None and key is not None and nxt < key:
+                    nxt = next(seen, None)
+                if key is not None and key == nxt:
+                    skipped += 1
+                    continue
+                kept.append(value)
+                if out_file is not None and len(kept) >= EXTERNAL_CHUNK_ITEMS:
+                    kept.tofile(out_file)
+                    kept = array("Q")
+            if out_file is not None:
+                kept.tofile(out_file)
+        finally:
+            if out_file is not None:
+                out_file.close()
+    finally:
+        conn.close()
+    if out_file is not None:
+        return PackedAsinFile(out_path, uniques.run_items), skipped
+    return kept, skipped
+
+
+def record_history(uniques, store, market):
+    """Upsert every emitted ASIN for store/market with the current time."""
+    now = datetime.now().isoformat(timespec="seconds")
+    rows = (
+        (store, market, key, now)
+        for key in (_history_key(v) for v in uniques)
+        if key is not None
+    )
+    conn = _history_connect()
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT INTO emitted (store, market, asin, last_emitted) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (store, market, asin) DO UPDATE SET last_emitted = excluded.last_emitted",
+                rows,
+            )
+    finally:
+        conn.close()
+
+
+def _memory_limit_mb(data):
+    try:
+        limit = int(data.get("memory_limit_mb") or 0)
+    except Exception:
+        return 0
+    return max(limit, 0)
+
+
+@contextmanager
+def loaded_asins(input_path, data):
+    """Yield (uniques, dups) for a request.
+
+    When ``memory_limit_mb`` is set and the file is too large to parse
+    in memory under it, ASINs are sort-merged through a temp folder that is
+    removed on exit.
+    """
+    use_cache = bool(data.get("use_cache", True))
+    limit = _memory_limit_mb(data)
+    if not limit or Path(input_path).stat().st_size * PARSE_MEMORY_FACTOR <= limit * 1024 * 1024:
+        yield extract_asins_cached(input_path, use_cache)
+        return
+    with tempfile.TemporaryDirectory(prefix="asin_batcher_") as workdir:
+        try:
+            result = extract_asins_external(input_path, workdir, limit)
+        except AsinPackError:
+            result = extract_asins_cached(input_path, use_cache)
+        yield result
+
+
+def _url_parts(market):
     if market == "US":
-        return f"https://www.amazon.com/dp/{asin}?th=1"
-    return f"https://www.amazon.com.mx/dp/{asin}?th=1"
+        return "https://www.amazon.com/dp/", "?th=1"
+    return "https://www.amazon.com.mx/dp/", "?th=1"
+
+
+def to_url(asin, market):
+    prefix, suffix = _url_parts(market)
+    return f"{prefix}{asin}{suffix}"
 
 
 def split_in_batches(items, batches):
@@ -232,40 +1249,142 @@ def sanitize_filename(text):
     repl = re.sub(r"_+", "_", repl)
     repl = repl.strip("_").strip(".")
     return repl or "archivo"
-def write_batches_as_txt(batches_list, folder, store, market, base_label):
-    out_files = []
+def batch_file_names(base_label, total):
     safe_base = sanitize_filename(base_label)
-    total = len(batches_list)
-    for idx, batch in enumerate(batches_list, start=1):
-        if total > 1:
-            fname = f"{safe_base}_{idx}.txt"
+    if total > 1:
+        return [f"{safe_base}_{idx}.txt" for idx in range(1, total + 1)]
+    return [f"{safe_base}.txt"]
+
+
+def _write_batch(f, batch, market):
+    # One write per chunk of URLs instead of one per line.
+    prefix, suffix = _url_parts(market)
+    sep = f"{suffix}\n{prefix}"
+    f.write("start_url\n")
+    for chunk in iter_asin_chunks(batch):
+        if chunk:
+            f.write(f"{prefix}{sep.join(chunk)}{suffix}\n")
+
+
+def _write_batch_file(fpath, batch, market, progress=None):
+    with Path(fpath).open("w", encoding="utf-8") as f:
+        _write_batch(f, batch, market)
+    if progress is not None:
+        progress.add(len(batch))
+    return str(fpath)
+
+
+def write_batches_as_txt(batches_list, folder, store, market, base_label, workers=DEFAULT_WRITE_WORKERS):
+    """Write one txt per batch; with workers > 1 files are written concurrently.
+
+    Returned paths keep batch order either way.
+    """
+    names = batch_file_names(base_label, len(batches_list))
+    paths = [Path(folder) / fname for fname in names]
+    progress = ProgressReporter("write")
+    with profile_phase("write"):
+        if workers <= 1 or len(paths) <= 1:
+            out_files = [_write_batch_file(fp, batch, market, progress) for fp, batch in zip(paths, batches_list)]
         else:
-            fname = f"{safe_base}.txt"
-        fpath = Path(folder) / fname
-        with fpath.open("w", encoding="utf-8") as f:
-            f.write("start_url\n")
-            for asin in batch:
-                f.write(to_url(asin, market) + "\n")
-        out_files.append(str(fpath))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                out_files = list(pool.map(
+                    _write_batch_file, paths, batches_list, [market] * len(paths), [progress] * len(paths)
+                ))
+    progress.finish()
     return out_files
 
 
-def zip_outputs(files, target_zip):
-    with zipfile.ZipFile(target_zip, "w", compression=zipfile.ZIP_DEFLATED) as z:
-        for fp in files:
-            z.write(fp, arcname=Path(fp).name)
+def write_batches_as_zip(batches_list, target_zip, market, base_label):
+    """Write each batch straight into a ZIP member, with no temp files."""
+    names = batch_file_names(base_label, len(batches_list))
+    progress = ProgressReporter("zip")
+    with profile_phase("zip"), zipfile.ZipFile(target_zip, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        for fname, batch in zip(names, batches_list):
+            with z.open(fname, "w") as member:
+                with io.TextIOWrapper(member, encoding="utf-8") as f:
+                    _write_batch(f, batch, market)
+            progress.add(len(batch))
+    progress.finish()
     return target_zip
 
 
+def _sitemap_engine():
+    """Import the Sitemap engine for its templates and sitemap writer.
+
+    Frozen builds bundle it; source runs import it from the sibling folder.
+    """
+    if not getattr(sys, "frozen", False):
+        path = str(Path(__file__).resolve().parent.parent / "Sitemap")
+        if path not in sys.path:
+            sys.path.append(path)
+    import form_site
+    return form_site
+
+
+def sitemap_titles(base_label, total):
+    """Sitemap ids for each batch, as the Sitemap tab names batch files."""
+    base_id = _sitemap_engine().sanitize_sitemap_id(base_label)
+    if total > 1:
+        return [f"{base_id}_{idx}" for idx in range(1, total + 1)]
+    return [base_id]
+
+
+def _batch_urls(batch, market):
+    prefix, suffix = _url_parts(market)
+    urls = []
+    for chunk in iter_asin_chunks(batch):
+        urls.extend(f"{prefix}{a}{suffix}" for a in chunk)
+    return urls
+
+
+@contextmanager
+def _open_zip(target_zip):
+    if not target_zip:
+        yield None
+        return
+    with zipfile.ZipFile(target_zip, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        yield z
+
+
+def write_batches_as_sitemaps(batches_list, store, market, base_label, folder="", target_zip=""):
+    """Write one WebScraper sitemap JSON per batch, skipping the txt round trip.
+
+    The template comes from the store like in the Sitemap engine. Files go to
+    folder, or straight into target_zip members when it is set.
+    """
+    sitemaps = _sitemap_engine()
+    template = sitemaps.load_template(sitemaps.select_template(store))
+    titles = sitemap_titles(base_label, len(batches_list))
+    progress = ProgressReporter("sitemaps")
+    out_files = []
+    with profile_phase("zip" if target_zip else "write"), _open_zip(target_zip) as z:
+        for title, batch in zip(titles, batches_list):
+            urls = _batch_urls(batch, market)
+            if z is not None:
+                with z.open(f"{title}.json", "w") as member, io.TextIOWrapper(member, encoding="utf-8") as f:
+                    sitemaps.write_sitemap(f, title, urls, template)
+            else:
+                fpath = Path(folder) / f"{title}.json"
+                with fpath.open("w", encoding="utf-8") as f:
+                    sitemaps.write_sitemap(f, title, urls, template)
+                out_files.append(str(fpath))
+            progress.add(len(batch))
+    progress.finish()
+    return out_files
+
+
 def reorder_asins(uniques, mode):
+    """Order sorted uniques (as returned by extract_asins_any) for output."""
     mode = (mode or "").lower()
     if mode == "inverso":
-        return sorted(uniques, reverse=True)
+        return uniques[::-1]
     if mode == "aleatorio":
-        shuffled = list(uniques)
+        if isinstance(uniques, PackedAsinFile):
+            return uniques.shuffled()
+        shuffled = uniques[:]
         random.shuffle(shuffled)
         return shuffled
-    return sorted(uniques)
+    return uniques
 
 
 def compute_store_from_selection(selected_store):
@@ -274,21 +1393,27 @@ def compute_store_from_selection(selected_store):
     return ALL_STORES[0]
 
 
-def export_duplicates_csv(dups, outdir):
-    if not dups:
+def export_asins_csv(asins, outdir, prefix):
+    """Write sorted ASINs (repeats collapsed) to <prefix>_<timestamp>.csv."""
+    if not asins:
         return ""
     Path(outdir).mkdir(parents=True, exist_ok=True)
-    fpath = Path(outdir) / f"duplicados_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    fpath = Path(outdir) / f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     with fpath.open("w", encoding="utf-8") as f:
         f.write("asin\n")
-        seen = set()
-        for a in dups:
-            if a not in seen:
-                seen.add(a)
-                f.write(a + "\n")
+        prev = None
+        for chunk in iter_asin_chunks(asins):
+            for a in chunk:
+                if a != prev:
+                    prev = a
+                    f.write(a + "\n")
     return str(fpath)
 
 
+def export_duplicates_csv(dups, outdir):
+    return export_asins_csv(dups, outdir, "duplicados")
+
+
 def _error(message, tb=None):
     return {"ok": False, "error": message, "traceback": tb or ""}
 
@@ -309,8 +1434,8 @@ def handle_preview(data):
         return _error("Missing input_path")
     if not Path(input_path).exists():
         return _error("Input file not found")
-    uniques, dups = extract_asins_any(input_path)
-    return _preview_response(uniques, dups)
+    with loaded_asins(input_path, data) as (uniques, dups):
+        return _preview_response(uniques, dups)
 
 
 def handle_export_duplicates(data):
@@ -321,26 +1446,20 @@ def handle_export_duplicates(data):
     if not Path(input_path).exists():
         return _error("Input file not found")
     outdir = (data.get("output_dir") or "").strip() or str(Path.home() / "Downloads")
-    uniques, dups = extract_asins_any(input_path)
-    csv_path = export_duplicates_csv(dups, outdir)
-    return {
-        "ok": True,
-        "duplicates": len(dups),
-        "csv_path": csv_path,
-    }
+    with loaded_asins(input_path, data) as (uniques, dups):
+        csv_path = export_duplicates_csv(dups, outdir)
+        return {
+            "ok": True,
+            "duplicates": len(dups),
+            "csv_path": csv_path,
+        }
 
 
-def handle_process(data):
-    """Generate URL batches and return output metadata."""
-    input_path = (data.get("input_path") or "").strip()
-    if not input_path:
-        return _error("Missing input_path")
-    if not Path(input_path).exists():
-        return _error("Input file not found")
-
-    outdir = (data.get("output_dir") or "").strip() or str(Path.home() / "Downloads")
-    ensure_folder(outdir)
+def resolve_target(data):
+    """Resolve naming, market, order and batch count for one output target.
 
+    Raises ValueError when the naming fields are incomplete.
+    """
     market = data.get("market") if data.get("market") in MARKETS else DEFAULT_MARKET
     order = data.get("order") if data.get("order") in ORDER_CHOICES else ORDER_CHOICES[0]
 
@@ -353,14 +1472,14 @@ def handle_process(data):
         if not store_name:
             store_name = (data.get("store") or "").strip()
         if not store_name:
-            return _error("Missing store_name")
+            raise ValueError("Missing store_name")
         base_label = f"{prefix1}{prefix2}{store_name}"
         name_store = store_name
     else:
         store = compute_store_from_selection(data.get("store"))
         file_label = (data.get("file_label") or "").strip()
         if not file_label:
-            return _error("Missing file_label")
+            raise ValueError("Missing file_label")
         base_label = f"{store}_{file_label}"
         name_store = store
 
@@ -371,58 +1490,305 @@ def handle_process(data):
     if batches < 1:
         batches = DEFAULT_BATCHES
 
-    zip_out = bool(data.get("zip_output"))
+    return {
+        "store": name_store,
+        "market": market,
+        "order": order,
+        "batches": batches,
+        "base_label": base_label,
+        "zip_output": bool(data.get("zip_output")),
+    }
 
-    uniques, dups = extract_asins_any(input_path)
-    if not uniques:
-        return _error("No valid ASINs found")
 
-    if batches > len(uniques):
-        return _error(
-            "La cantidad de lotes no puede ser mayor que la cantidad de URLs. "
-            f"URLs: {len(uniques)} | Lotes: {batches}"
-        )
+def resolve_targets(data):
+    """Resolve every target of a request.
+
+    ``targets`` entries override the top-level fields; labels repeated
+    across targets get the market (then the position) appended so outputs
+    do not overwrite each other.
+    """
+    raw_targets = data.get("targets")
+    if not raw_targets:
+        return [resolve_target(data)]
+    shared = {k: v for k, v in data.items() if k != "targets"}
+    targets = []
+    for entry in raw_targets:
+        if not isinstance(entry, dict):
+            raise ValueError("Each target must be an object")
+        targets.append(resolve_target({**shared, **entry}))
+
+    counts = {}
+    for t in targets:
+        key = sanitize_filename(t["base_label"])
+        counts[key] = counts.get(key, 0) + 1
+    used = set()
+    for idx, t in enumerate(targets, start=1):
+        label = t["base_label"]
+        if counts[sanitize_filename(label)] > 1:
+            label = f"{label}_{t['market']}"
+        if sanitize_filename(label) in used:
+            label = f"{label}_{idx}"
+        used.add(sanitize_filename(label))
+        t["base_label"] = label
+    return targets
+
+
+def write_target(uniques, target, outdir, write_workers=DEFAULT_WRITE_WORKERS, output="txt"):
+    """Order, split and write sorted uniques for one target.
+
+    ``output`` is "txt" for URL batch files or "sitemap" for sitemap JSON.
+    """
+    with profile_phase("sort"):
+        ordered = reorder_asins(uniques, target["order"])
+    batches_list = split_in_batches(ordered, target["batches"])
+    base_label = target["base_label"]
 
-    uniques = reorder_asins(uniques, order)
+    zip_path = ""
+    work_dir = ""
+    if target["zip_output"]:
+        zip_path = str(Path(outdir) / f"{sanitize_filename(base_label)}.zip")
+        if output == "sitemap":
+            write_batches_as_sitemaps(batches_list, target["store"], target["market"], base_label, target_zip=zip_path)
+        else:
+            write_batches_as_zip(batches_list, zip_path, target["market"], base_label)
+    else:
+        ddmmaa = datetime.now().strftime("%d%m%y")
+        hhmm = datetime.now().strftime("%H%M")
+        folder_name = f"{sanitize_filename(base_label)}_{ddmmaa}_{hhmm}"
+        work_dir = Path(outdir) / folder_name
+        ensure_folder(str(work_dir))
+        if output == "sitemap":
+            write_batches_as_sitemaps(batches_list, target["store"], target["market"], base_label, folder=str(work_dir))
+        else:
+            write_batches_as_txt(
+                batches_list, str(work_dir), target["store"], target["market"], base_label, write_workers
+            )
 
-    ddmmaa = datetime.now().strftime("%d%m%y")
-    hhmm = datetime.now().strftime("%H%M")
-    folder_name = f"{sanitize_filename(base_label)}_{ddmmaa}_{hhmm}"
+    return {
+        "store": target["store"],
+        "market": target["market"],
+        "output_folder": str(work_dir),
+        "zip_path": zip_path,
+    }
 
-    work_dir = Path(outdir) / folder_name
-    ensure_folder(str(work_dir))
-    batches_list = split_in_batches(uniques, batches)
-    out_files = write_batches_as_txt(batches_list, str(work_dir), name_store, market, base_label)
 
-    zip_path = ""
-    if zip_out:
-        zip_path = str(Path(outdir) / f"{sanitize_filename(base_label)}.zip")
-        zip_outputs(out_files, zip_path)
+def plan_targets(uniques, targets, data):
+    """Filter and validate every target from one sorted unique set.
+
+    Returns the plan for write_targets. Raises ValueError if a target
+    cannot be produced; nothing is written here.
+    """
+    try:
+        write_workers = int(data.get("write_workers") or DEFAULT_WRITE_WORKERS)
+    except Exception:
+        write_workers = DEFAULT_WRITE_WORKERS
+
+    try:
+        since = parse_history_since(data.get("skip_seen_since"))
+    except ValueError:
+        raise ValueError("Invalid skip_seen_since")
+    record = bool(data.get("record_history")) or bool(since)
+
+    planned = []
+    for target in targets:
+        values, skipped = uniques, 0
+        if since:
+            with profile_phase("history"):
+                values, skipped = filter_seen_asins(uniques, target["store"], target["market"], since)
+            if not values:
+                raise ValueError(f"No new ASINs since {since} for {target['store']} {target['market']}")
+        if target["batches"] > len(values):
+            raise ValueError(
+                "La cantidad de lotes no puede ser mayor que la cantidad de URLs. "
+                f"URLs: {len(values)} | Lotes: {target['batches']}"
+            )
+        planned.append((target, values, skipped))
+    return write_workers, since, record, planned
+
+
+def write_targets(plan, outdir, data, output="txt"):
+    """Write the targets of a plan_targets plan; returns the response fields."""
+    write_workers, since, record, planned = plan
+    results = []
+    for target, values, skipped in planned:
+        result = write_target(values, target, outdir, write_workers, output)
+        if record:
+            with profile_phase("history"):
+                record_history(values, target["store"], target["market"])
+        if since:
+            result["skipped_seen"] = skipped
+        results.append(result)
+
+    if data.get("targets"):
+        return {"output_folder": outdir, "zip_path": "", "targets": results}
+    out = {
+        "output_folder": results[0]["output_folder"],
+        "zip_path": results[0]["zip_path"],
+    }
+    if since:
+        out["skipped_seen"] = results[0]["skipped_seen"]
+    return out
+
+
+def emit_targets(uniques, targets, outdir, data, output="txt"):
+    """Filter, validate and write every target from one sorted unique set.
+
+    Returns the output fields of the response. Raises ValueError before
+    anything is written if a target cannot be produced.
+    """
+    return write_targets(plan_targets(uniques, targets, data), outdir, data, output)
+
+
+def handle_process(data, output="txt"):
+    """Generate URL batches and return output metadata.
+
+    A ``targets`` list fans one parse of the input out to several
+    store/market/batches/order combinations.
+    """
+    input_path = (data.get("input_path") or "").strip()
+    if not input_path:
+        return _error("Missing input_path")
+    if not Path(input_path).exists():
+        return _error("Input file not found")
+
+    outdir = (data.get("output_dir") or "").strip() or str(Path.home() / "Downloads")
+    ensure_folder(outdir)
+
+    try:
+        targets = resolve_targets(data)
+    except ValueError as exc:
+        return _error(str(exc))
+
+    with loaded_asins(input_path, data) as (uniques, dups):
+        if not uniques:
+            return _error("No valid ASINs found")
         try:
-            shutil.rmtree(work_dir)
-        except Exception:
-            pass
+            outputs = emit_targets(uniques, targets, outdir, data, output)
+        except ValueError as exc:
+            return _error(str(exc))
+        resp = _preview_response(uniques, dups)
+        resp.update(outputs)
+        return resp
+
+
+def handle_sitemaps(data):
+    """Like process, but each batch becomes a WebScraper sitemap JSON.
+
+    Sitemaps use the store's template and the ids the Sitemap tab would give
+    the batch files (``<base_id>_<n>``).
+    """
+    return handle_process(data, output="sitemap")
+
+
+def handle_delta(data):
+    """Batch ASINs added since a previous inventory report.
+
+    ASINs that disappeared are exported to a CSV. Both reports go through
+    the packed/sorted readers and are compared with a sorted merge.
+    """
+    paths = {}
+    for key in ("previous_path", "current_path"):
+        path = (data.get(key) or "").strip()
+        if not path:
+            return _error(f"Missing {key}")
+        if not Path(path).exists():
+            return _error(f"Input file not found: {path}")
+        if not is_inventory_report(path):
+            return _error(f"Not an inventory report: {path}")
+        paths[key] = path
 
-    resp = _preview_response(uniques, dups)
-    resp.update({
-        "output_folder": "" if zip_out else str(work_dir),
-        "zip_path": zip_path,
-    })
-    return resp
+    outdir = (data.get("output_dir") or "").strip() or str(Path.home() / "Downloads")
+    ensure_folder(outdir)
+
+    try:
+        targets = resolve_targets(data)
+    except ValueError as exc:
+        return _error(str(exc))
+
+    with loaded_asins(paths["previous_path"], data) as (previous, _), \
+            loaded_asins(paths["current_path"], data) as (current, _):
+        added = asin_difference(current, previous)
+        removed = asin_difference(previous, current)
+        # Targets are validated before the removed CSV is written, so a
+        # rejected request leaves nothing behind.
+        plan = None
+        if added:
+            try:
+                plan = plan_targets(added, targets, data)
+            except ValueError as exc:
+                return _error(str(exc))
+        resp = {
+            "ok": True,
+            "previous": len(previous),
+            "current": len(current),
+            "added": len(added),
+            "removed": len(removed),
+            "removed_csv": export_asins_csv(removed, outdir, "eliminados"),
+            "output_folder": "",
+            "zip_path": "",
+        }
+        if plan is not None:
+            try:
+                resp.update(write_targets(plan, outdir, data))
+            except ValueError as exc:
+                return _error(str(exc))
+        return resp
+
+
+ACTIONS = {
+    "preview": handle_preview,
+    "process": handle_process,
+    "sitemaps": handle_sitemaps,
+    "export_duplicates": handle_export_duplicates,
+    "delta": handle_delta,
+}
 
 
 def handle_request(data):
     action = (data.get("action") or "").strip().lower()
-    if action == "preview":
-        return handle_preview(data)
-    if action == "process":
-        return handle_process(data)
-    if action == "export_duplicates":
-        return handle_export_duplicates(data)
-    return _error("Unknown action")
+    handler = ACTIONS.get(action)
+    if handler is None:
+        return _error("Unknown action")
+    dump_dir = (data.get("output_dir") or "").strip() or str(Path.home() / "Downloads")
+    with progress_scope(data), profile_scope(data, dump_dir) as timer, \
+            rejected_scope(bool(data.get("strict_asins"))) as rejected:
+        resp = handler(data)
+    if resp.get("ok"):
+        resp["rejected"] = rejected
+        resp["rejected_total"] = sum(rejected.values())
+    if timer is not None:
+        resp.update(timer.report())
+    return resp
+
+
+def serve(stdin=None, stdout=None):
+    """Answer newline-delimited JSON requests until stdin is closed.
+
+    Each response is written as one JSON line carrying the request ``id``
+    so the client can keep a single warm process across actions.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    for line in stdin:
+        if not line.strip():
+            continue
+        request_id = None
+        try:
+            data = json.loads(line)
+            if isinstance(data, dict):
+                request_id = data.get("id")
+            resp = handle_request(data)
+        except Exception as exc:
+            resp = _error(str(exc), traceback.format_exc())
+        resp["id"] = request_id
+        stdout.write(json.dumps(resp, ensure_ascii=True) + "\n")
+        stdout.flush()
 
 
 def main():
+    if "--serve" in sys.argv[1:]:
+        serve()
+        return
     raw = sys.stdin.read()
     if not raw.strip():
         resp = _error("No input received")
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Helpers shared by the engines.
+
+Progress records for requests that set ``progress`` and phase timings for
+requests that set ``profile``. Engines import this
+module from the sibling ``Common`` folder; frozen builds bundle it.
+"""
+import cProfile
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# Progress records: at most one per PROGRESS_INTERVAL seconds per phase;
+# streams are checked every PROGRESS_CHECK_ROWS items.
+PROGRESS_INTERVAL = 0.5
+PROGRESS_CHECK_ROWS = 4096
+
+
+_PROGRESS = threading.local()
+
+
+@contextmanager
+def progress_scope(data):
+    """Enable stderr progress records for a request that sets ``progress``."""
+    previous = getattr(_PROGRESS, "settings", None)
+    _PROGRESS.settings = {"id": data.get("id")} if data.get("progress") else None
+    try:
+        yield
+    finally:
+        _PROGRESS.settings = previous
+        _PROGRESS.bytes_source = None
+
+
+def set_progress_bytes_source(source):
+    """Register a callable returning bytes read so far by the active reader."""
+    _PROGRESS.bytes_source = source
+
+
+class ProgressReporter:
+    """Throttled progress records for one phase.
+
+    Records are written to stderr as JSON lines (phase, rows, bytes,
+    rows_per_sec) while the request's ``progress`` flag is set; otherwise
+    every method is a cheap no-op.
+    """
+
+    def __init__(self, phase, total_bytes=0):
+        self.settings = getattr(_PROGRESS, "settings", None)
+        self.phase = phase
+        self.total_bytes = total_bytes
+        self.rows = 0
+        self.bytes_read = 0
+        self.started = self.last = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.settings is not None
+
+    def add(self, rows, nbytes=0):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.rows += rows
+            self.bytes_read += nbytes
+            now = time.perf_counter()
+            if now - self.last >= PROGRESS_INTERVAL:
+                self._emit(now, False)
+
+    def track(self, iterable):
+        """Pass items through, counting one row each."""
+        if not self.enabled:
+            return iterable
+        return self._track(iterable)
+
+    def _track(self, iterable):
+        n = 0
+        for item in iterable:
+            yield item
+            n += 1
+            if n == PROGRESS_CHECK_ROWS:
+                self.add(n)
+                n = 0
+        self.add(n)
+
+    def finish(self):
+        if self.enabled:
+            with self._lock:
+                if self.total_bytes:
+                    self.bytes_read = self.total_bytes
+                _PROGRESS.bytes_source = None
+                self._emit(time.perf_counter(), True)
+
+    def _emit(self, now, done):
+        self.last = now
+        elapsed = now - self.started
+        source = getattr(_PROGRESS, "bytes_source", None)
+        record = {
+            "event": "progress",
+            "phase": self.phase,
+            "rows": self.rows,
+            "bytes": self.bytes_read,
+            "rows_per_sec": round(self.rows / elapsed, 1) if elapsed > 0 else 0.0,
+            "elapsed": round(elapsed, 3),
+            "done": done,
+        }
+        if source is not None:
+            try:
+                record["bytes"] = source()
+            except Exception:
+                pass
+        if self.total_bytes:
+            record["total_bytes"] = self.total_bytes
+        if self.settings.get("id") is not None:
+            record["id"] = self.settings["id"]
+        try:
+            sys.stderr.write(json.dumps(record, ensure_ascii=True) + "\n")
+            sys.stderr.flush()
+        except Exception:
+            pass
+
+
+_PROFILE = threading.local()
+# tracemalloc is process-wide: memory-traced requests (several host
+# workers) run one at a time so one cannot reset or stop another's
+# tracing. Their peak still includes allocations of untraced requests
+# running alongside.
+_TRACE_LOCK = threading.Lock()
+
+
+class PhaseTimer:
+    """Wall/CPU time per phase plus input counters for a profiled request."""
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {"input_bytes": 0, "input_rows": 0}
+        self.peak_memory = None
+        self.profile_path = ""
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+
+    def add(self, name, wall, cpu):
+        entry = self.phases.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+        entry["wall"] += wall
+        entry["cpu"] += cpu
+
+    def report(self):
+        timings = {
+            "total": {
+                "wall": round(time.perf_counter() - self.started, 6),
+                "cpu": round(time.process_time() - self.cpu_started, 6),
+            },
+        }
+        for name, entry in self.phases.items():
+            timings[name] = {"wall": round(entry["wall"], 6), "cpu": round(entry["cpu"], 6)}
+        report = {"timings": timings}
+        report.update(self.counters)
+        if self.peak_memory is not None:
+            report["peak_memory_bytes"] = self.peak_memory
+        if self.profile_path:
+            report["profile_path"] = self.profile_path
+        return report
+
+
+@contextmanager
+def profile_phase(name):
+    """Time a block under ``name`` when the current request is profiled.
+
+    Phases may nest (``import`` runs inside ``read``), so they can add up to
+    more than the total.
+    """
+    timer = getattr(_PROFILE, "timer", None)
+    if timer is None:
+        yield
+        return
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+
+def profile_count(key, n):
+    timer = getattr(_PROFILE, "timer", None)
+    if timer is not None:
+        timer.counters[key] = timer.counters.get(key, 0) + n
+
+
+@contextmanager
+def profile_scope(data, dump_dir):
+    """Profile a request that sets ``profile``; yields a PhaseTimer or None.
+
+    Peak memory comes from tracemalloc unless ``profile_memory`` is false
+    (tracing slows the run down); ``profile_dump`` also writes cProfile
+    stats into dump_dir.
+    """
+    if not data.get("profile"):
+        yield None
+        return
+    timer = PhaseTimer()
+    previous = getattr(_PROFILE, "timer", None)
+    _PROFILE.timer = timer
+    trace_memory = data.get("profile_memory", True) is not False
+    if trace_memory:
+        _TRACE_LOCK.acquire()
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif trace_memory:
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile() if data.get("profile_dump") else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield timer
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            try:
+                Path(dump_dir).mkdir(parents=True, exist_ok=True)
+                stats_path = Path(dump_dir) / f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof"
+                profiler.dump_stats(str(stats_path))
+                timer.profile_path = str(stats_path)
+            except Exception:
+                pass
+        if trace_memory:
+            timer.peak_memory = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+            _TRACE_LOCK.release()
+        _PROFILE.timer = previous
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""Streaming xlsx row reader shared by the engines.
+
+Reads worksheet rows straight from the sheet XML inside the workbook zip,
+yielding values_only tuples like openpyxl read-only mode. Number formats
+from styles.xml are not applied: a date-formatted numeric cell comes back as
+its Excel serial number, where openpyxl returns a datetime.
+"""
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+XLSX_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+XLSX_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+XLSX_READ_BYTES = 64 * 1024
+# Sheet and shared-string XML is scanned as bytes with these patterns; any
+# namespace prefix is accepted.
+_XP = rb"(?:[\w.-]+:)?"
+XLSX_SHEET_DATA_RE = re.compile(rb"<" + _XP + rb"sheetData\b[^>]*?(/?)>")
+XLSX_SHEET_END_RE = re.compile(rb"</" + _XP + rb"sheetData>")
+XLSX_ROW_END_RE = re.compile(rb"</" + _XP + rb"row>")
+_XA = rb"""(?:"[^"]*"|'[^']*')"""
+# One token per row start or cell. Groups: row marker, row number, row
+# self-closing slash; cell column letters, cell type, cell self-closing
+# slash, plain <v> text, plain inline <t> text, any other cell content.
+XLSX_TOKEN_RE = re.compile(
+    rb"<" + _XP + rb"(?:(row)(?:\s+(?:r=[\"'](\d*)[\"']|[\w:.-]+=" + _XA + rb"))*\s*(/?)>"
+    rb"|c(?:\s+(?:r=[\"']([A-Za-z]*)\d*[\"']|t=[\"']([^\"']*)[\"']|[\w:.-]+=" + _XA + rb"))*\s*"
+    rb"(?:(/)>|>(?:<" + _XP + rb"v>([^<]*)</" + _XP + rb"v>"
+    rb"|<" + _XP + rb"is><" + _XP + rb"t(?:\s[^>]*)?>([^<]*)</" + _XP + rb"t></" + _XP + rb"is>"
+    rb"|(.*?))</" + _XP + rb"c>))",
+    re.DOTALL,
+)
+XLSX_SI_END_RE = re.compile(rb"</" + _XP + rb"si>")
+XLSX_SI_RE = re.compile(rb"<" + _XP + rb"si\b[^>]*?(?:/>|>(.*?)</" + _XP + rb"si>)", re.DOTALL)
+XLSX_V_RE = re.compile(rb"<" + _XP + rb"v>([^<]*)</")
+XLSX_T_RE = re.compile(rb"<" + _XP + rb"t\b[^>]*?(?:/>|>([^<]*)</)")
+XLSX_RPH_RE = re.compile(rb"<" + _XP + rb"rPh\b.*?</" + _XP + rb"rPh>", re.DOTALL)
+XLSX_ENTITY_RE = re.compile(rb"&(#x[0-9a-fA-F]+|#\d+|lt|gt|amp|quot|apos);")
+_XLSX_ENTITIES = {b"lt": "<", b"gt": ">", b"amp": "&", b"quot": '"', b"apos": "'"}
+
+
+class XlsxFormatError(ValueError):
+    pass
+
+
+def _xlsx_part_path(target, base="xl"):
+    target = target.replace("\\", "/")
+    if target.startswith("/"):
+        return target.lstrip("/")
+    parts = base.split("/") if base else []
+    for piece in target.split("/"):
+        if piece == "..":
+            if parts:
+                parts.pop()
+        elif piece and piece != ".":
+            parts.append(piece)
+    return "/".join(parts)
+
+
+def _xlsx_parts(z):
+    """Return (worksheet part paths in workbook order, shared strings path)."""
+    rels = {}
+    shared_path = ""
+    root = ET.fromstring(z.read("xl/_rels/workbook.xml.rels"))
+    for rel in root.iter(f"{{{XLSX_PKG_REL_NS}}}Relationship"):
+        rel_type = rel.get("Type") or ""
+        path = _xlsx_part_path(rel.get("Target") or "")
+        if rel_type.endswith("/worksheet"):
+            rels[rel.get("Id")] = path
+        elif rel_type.endswith("/sharedStrings"):
+            shared_path = path
+    workbook = ET.fromstring(z.read("xl/workbook.xml"))
+    sheets = []
+    for elem in workbook.iter():
+        if elem.tag.rsplit("}", 1)[-1] == "sheet":
+            rel_id = elem.get(f"{{{XLSX_REL_NS}}}id")
+            if rel_id in rels:
+                sheets.append(rels[rel_id])
+    if not sheets:
+        raise XlsxFormatError("No worksheets found")
+    names = set(z.namelist())
+    missing = [path for path in sheets if path not in names]
+    if missing:
+        raise XlsxFormatError(f"Worksheet part not found: {missing[0]}")
+    return sheets, shared_path
+
+
+def _xml_unescape(raw):
+    if b"&" not in raw:
+        return raw.decode("utf-8")
+
+    def entity(m):
+        name = m.group(1)
+        if name.startswith(b"#x"):
+            return chr(int(name[2:], 16)).encode("utf-8")
+        if name.startswith(b"#"):
+            return chr(int(name[1:])).encode("utf-8")
+        return _XLSX_ENTITIES[name].encode("utf-8")
+
+    return XLSX_ENTITY_RE.sub(entity, raw).decode("utf-8")
+
+
+def _xlsx_rich_text(raw):
+    # <t> text of a shared/inline string, rich text runs included and
+    # phonetic runs (<rPh>) skipped.
+    if b"rPh" in raw:
+        raw = XLSX_RPH_RE.sub(b"", raw)
+    return "".join(_xml_unescape(t) for t in XLSX_T_RE.findall(raw))
+
+
+def _iter_xml_chunks(f, end_re):
+    """Yield the part's bytes in XLSX_READ_BYTES chunks cut after end tags.
+
+    end_re matches the closing tag of the repeated element, so no element
+    is split between chunks.
+    """
+    buf = b""
+    while True:
+        chunk = f.read(XLSX_READ_BYTES)
+        buf += chunk
+        if not chunk:
+            if buf:
+                yield buf
+            return
+        # Text cannot hold a raw "<", so walking back over "</" only visits
+        # closing tags.
+        pos = buf.rfind(b"</")
+        while pos >= 0:
+            m = end_re.match(buf, pos)
+            if m:
+                yield buf[:m.end()]
+                buf = buf[m.end():]
+                break
+            pos = buf.rfind(b"</", 0, pos)
+
+
+def _xlsx_shared_strings(z, path):
+    if not path or path not in z.namelist():
+        return []
+    strings = []
+    with z.open(path) as f:
+        for chunk in _iter_xml_chunks(f, XLSX_SI_END_RE):
+            strings.extend(_xlsx_rich_text(raw) if raw else "" for raw in XLSX_SI_RE.findall(chunk))
+    return strings
+
+
+def _xlsx_number(text):
+    # Values that do not parse come back as text rather than stopping the
+    # sheet half way through.
+    try:
+        if b"." in text or b"E" in text or b"e" in text:
+            return float(text)
+        return int(text)
+    except ValueError:
+        return _xml_unescape(text)
+
+
+_XLSX_COLUMNS = {}
+
+
+def _xlsx_column(letters):
+    idx = _XLSX_COLUMNS.get(letters)
+    if idx is None:
+        idx = 0
+        for ch in letters.upper():
+            idx = idx * 26 + ch - 64
+        idx -= 1
+        _XLSX_COLUMNS[letters] = idx
+    return idx
+
+
+def _xlsx_cell_value(kind, content, shared):
+    # Cells whose content is more than a lone <v> or plain inline string,
+    # e.g. formulas or rich text.
+    if kind == b"inlineStr":
+        return _xlsx_rich_text(content)
+    m = XLSX_V_RE.search(content)
+    return _xlsx_value(kind, m.group(1) if m else b"", shared)
+
+
+def _xlsx_value(kind, text, shared):
+    if not text:
+        return None
+    if kind == b"s":
+        try:
+            return shared[int(text)]
+        except (ValueError, IndexError):
+            return _xml_unescape(text)
+    if kind == b"str" or kind == b"e" or kind == b"inlineStr":
+        return _xml_unescape(text)
+    if kind == b"b":
+        return text.strip() == b"1"
+    if kind == b"n":
+        return _xlsx_number(text)
+    # ISO dates (t="d") and unknown types keep their text.
+    return _xml_unescape(text)
+
+
+def _iter_xlsx_sheet(z, path, shared):
+    """Yield row value tuples from one worksheet part.
+
+    Rows missing from the XML come back as empty tuples, as openpyxl
+    yields them.
+    """
+    row = None
+    expected_row = 1
+    columns = _XLSX_COLUMNS
+    with z.open(path) as f:
+        started = False
+        for chunk in _iter_xml_chunks(f, XLSX_ROW_END_RE):
+            start = 0
+            if not started:
+                m = XLSX_SHEET_DATA_RE.search(chunk)
+                if m is None:
+                    continue
+                if m.group(1):
+                    return
+                started = True
+                start = m.end()
+            end = XLSX_SHEET_END_RE.search(chunk, start)
+            tokens = XLSX_TOKEN_RE.findall(chunk, start, end.start() if end else len(chunk))
+            for is_row, number, closed, column, kind, empty, value, inline, other in tokens:
+                if is_row:
+                    if row is not None:
+                        yield tuple(row)
+                    if number:
+                        number = int(number)
+                        for _ in range(expected_row, number):
+                            yield ()
+                        expected_row = number + 1
+                    else:
+                        expected_row += 1
+                    if closed:
+                        row = None
+                        yield ()
+                    else:
+                        row = []
+                    continue
+                if row is None:
+                    continue
+                if column:
+                    col = columns.get(column)
+                    if col is None:
+                        col = _xlsx_column(column)
+                    if col > len(row):
+                        row.extend([None] * (col - len(row)))
+                if empty:
+                    row.append(None)
+                elif value:
+                    row.append(_xlsx_value(kind or b"n", value, shared))
+                elif inline:
+                    row.append(_xml_unescape(inline) if b"&" in inline else inline.decode("utf-8"))
+                elif other:
+                    row.append(_xlsx_cell_value(kind or b"n", other, shared))
+                else:
+                    row.append("" if kind == b"inlineStr" else None)
+            if end:
+                break
+    if row is not None:
+        yield tuple(row)
+
+
+def _iter_xlsx_rows(z, sheets, shared):
+    try:
+        for path in sheets:
+            yield from _iter_xlsx_sheet(z, path, shared)
+    finally:
+        z.close()
+
+
+def open_xlsx_rows(path, first_sheet_only=False):
+    """Return an iterator of row value tuples read straight from the sheet XML.
+
+    The workbook is opened as a zip, shared strings are resolved up front
+    and sheets are scanned in chunks; values are None, str, int, float or
+    bool like openpyxl's values_only rows, except that cell styles are not
+    read: date-formatted numbers stay serial numbers (openpyxl gives a
+    datetime), and ISO dates and values that do not parse stay text. Raises
+    (before yielding) for workbooks this reader cannot handle, so callers
+    can fall back to openpyxl.
+    """
+    z = zipfile.ZipFile(path)
+    try:
+        sheets, shared_path = _xlsx_parts(z)
+        shared = _xlsx_shared_strings(z, shared_path)
+    except Exception:
+        z.close()
+        raise
+    return _iter_xlsx_rows(z, sheets[:1] if first_sheet_only else sheets, shared)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Engine host.
+
+Serves the Asin Batcher, Sitemap and Formato engines from one warm
+process. Requests carry an ``engine`` field and are routed to the
+matching ``handle_request``; engine modules are imported on first use.
+"""
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ENGINE_FOLDERS = {
+    "asin_batcher": "AsinBatcherEngine",
+    "sitemap": "Sitemap",
+    "formato": "Formato",
+}
+ENGINE_ALIASES = {
+    "asinbatcher": "asin_batcher",
+    "form_site": "sitemap",
+    "format": "formato",
+}
+DEFAULT_WORKERS = 1
+
+_HANDLERS = {}
+_LOAD_LOCK = threading.Lock()
+
+
+def _add_engine_paths():
+    # Frozen builds bundle the engine modules; source runs import them
+    # from the sibling engine folders.
+    if getattr(sys, "frozen", False):
+        return
+    engines_dir = Path(__file__).resolve().parent.parent
+    for folder in ENGINE_FOLDERS.values():
+        path = str(engines_dir / folder)
+        if path not in sys.path:
+            sys.path.append(path)
+
+
+def normalize_engine(value):
+    name = (value or "").strip().lower().replace("-", "_").replace(" ", "_")
+    return ENGINE_ALIASES.get(name, name)
+
+
+def _import_handler(name):
+    if name == "asin_batcher":
+        import engine as module
+    elif name == "sitemap":
+        import form_site as module
+    else:
+        import format as module
+    return module.handle_request
+
+
+def get_handler(name):
+    """Return the engine ``handle_request``, importing it on first use."""
+    handler = _HANDLERS.get(name)
+    if handler is not None:
+        return handler
+    with _LOAD_LOCK:
+        handler = _HANDLERS.get(name)
+        if handler is None:
+            handler = _import_handler(name)
+            _HANDLERS[name] = handler
+    return handler
+
+
+def _error(message, tb=None):
+    return {"ok": False, "error": message, "traceback": tb or ""}
+
+
+def handle_request(data):
+    name = normalize_engine(data.get("engine"))
+    if not name:
+        return _error("Missing engine")
+    if name not in ENGINE_FOLDERS:
+        return _error(f"Unknown engine: {name}")
+    return get_handler(name)(data)
+
+
+def _answer(data):
+    try:
+        return handle_request(data)
+    except Exception as exc:
+        return _error(str(exc), traceback.format_exc())
+
+
+def _parse_workers(argv):
+    for idx, arg in enumerate(argv):
+        value = None
+        if arg.startswith("--workers="):
+            value = arg.split("=", 1)[1]
+        elif arg == "--workers" and idx + 1 < len(argv):
+            value = argv[idx + 1]
+        if value is not None:
+            try:
+                return max(1, int(value))
+            except ValueError:
+                return DEFAULT_WORKERS
+    return DEFAULT_WORKERS
+
+
+def serve(workers=DEFAULT_WORKERS, stdin=None, stdout=None):
+    """Answer newline-delimited JSON requests until stdin is closed.
+
+    With more than one worker, requests run concurrently and responses are
+    written as they complete; clients match them through the ``id`` field.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    write_lock = threading.Lock()
+
+    def respond(resp, request_id):
+        resp["id"] = request_id
+        line = json.dumps(resp, ensure_ascii=True) + "\n"
+        with write_lock:
+            stdout.write(line)
+            stdout.flush()
+
+    def run(data, request_id):
+        respond(_answer(data), request_id)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for line in stdin:
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except Exception as exc:
+                respond(_error(str(exc), traceback.format_exc()), None)
+                continue
+            if not isinstance(data, dict):
+                respond(_error("Request must be a JSON object"), None)
+                continue
+            request_id = data.get("id")
+            if workers > 1:
+                pool.submit(run, data, request_id)
+            else:
+                run(data, request_id)
+
+
+def main():
+    _add_engine_paths()
+    os.environ.setdefault("PANDAS_IGNORE_CLIPBOARD", "1")
+    argv = sys.argv[1:]
+    if "--serve" in argv:
+        serve(_parse_workers(argv))
+        return
+    raw = sys.stdin.read()
+    if not raw.strip():
+        resp = _error("No input received")
+    else:
+        try:
+            data = json.loads(raw)
+            resp = handle_request(data)
+        except Exception as exc:
+            resp = _error(str(exc), traceback.format_exc())
+    sys.stdout.write(json.dumps(resp, ensure_ascii=True))
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -12,6 +12,19 @@ import sys
 import traceback
 from pathlib import Path
 
+# Shared helpers live in Engines/Common; frozen builds bundle them.
+if not getattr(sys, "frozen", False):
+    _COMMON_DIR = str(Path(__file__).resolve().parent.parent / "Common")
+    if _COMMON_DIR not in sys.path:
+        sys.path.append(_COMMON_DIR)
+
+from engine_support import (
+    ProgressReporter, progress_scope,
+    profile_count,
+    profile_phase,
+    profile_scope,
+)
+
 TEMPLATE_FILES = {
     "tiendas": "PlantillaSitemapsTiendas.json",
     "bbvs": "PlantillaSitemapsBBvs.json",
@@ -154,17 +167,19 @@ def detect_csv_delimiter(sample):
 
 
 def update_csv_headers(path, template_choice):
-    text, encoding = read_text_with_encoding(path)
-    if not text.strip():
-        raise RuntimeError("Empty CSV file")
-    delimiter = detect_csv_delimiter(text[:4096])
-    rows = list(csv.reader(io.StringIO(text), delimiter=delimiter))
+    with profile_phase("read"):
+        text, encoding = read_text_with_encoding(path)
+        if not text.strip():
+            raise RuntimeError("Empty CSV file")
+        delimiter = detect_csv_delimiter(text[:4096])
+        rows = list(csv.reader(io.StringIO(text), delimiter=delimiter))
     if not rows:
         raise RuntimeError("Empty CSV file")
+    profile_count("input_rows", len(rows))
     headers = rows[0]
     template_key = resolve_template(template_choice, headers)
     rows[0] = apply_first_headers(headers)
-    with open(path, "w", encoding=encoding, newline="") as f:
+    with profile_phase("write"), open(path, "w", encoding=encoding, newline="") as f:
         writer = csv.writer(f, delimiter=delimiter)
         writer.writerows(rows)
     return template_key
@@ -172,10 +187,12 @@ def update_csv_headers(path, template_choice):
 
 def update_xlsx_headers(path, template_choice):
     try:
-        from openpyxl import load_workbook
+        with profile_phase("import"):
+            from openpyxl import load_workbook
     except Exception as exc:
         raise RuntimeError("openpyxl is required to edit .xlsx files") from exc
-    wb = load_workbook(path)
+    with profile_phase("read"):
+        wb = load_workbook(path)
     try:
         template_key = template_choice
         if (template_choice or "").strip().lower() not in TEMPLATE_FILES:
@@ -196,7 +213,8 @@ def update_xlsx_headers(path, template_choice):
                 ws.cell(row=1, column=1).value = FIRST_HEADERS[0]
             if ws.max_column >= 2:
                 ws.cell(row=1, column=2).value = FIRST_HEADERS[1]
-        wb.save(path)
+        with profile_phase("write"):
+            wb.save(path)
     finally:
         wb.close()
     return template_key
@@ -229,15 +247,19 @@ def handle_process(data):
     updated_files = []
     template_counts = {}
 
+    progress = ProgressReporter("files")
     for fp in input_files:
         if not Path(fp).exists():
             return _error(f"Input file not found: {fp}")
+        profile_count("input_bytes", Path(fp).stat().st_size)
         try:
             template_key = update_headers_in_file(fp, template_choice)
             updated_files.append(fp)
             template_counts[template_key] = template_counts.get(template_key, 0) + 1
         except Exception as exc:
             return _error(f"Failed to update {fp}: {exc}", traceback.format_exc())
+        progress.add(1, Path(fp).stat().st_size)
+    progress.finish()
 
     return {
         "ok": True,
@@ -246,11 +268,22 @@ def handle_process(data):
     }
 
 
+def _profile_dump_dir(data):
+    for fp in data.get("input_files") or []:
+        if fp:
+            return str(Path(fp).resolve().parent)
+    return str(Path.home() / "Downloads")
+
+
 def handle_request(data):
     action = (data.get("action") or "").strip().lower()
-    if action == "process":
-        return handle_process(data)
-    return _error("Unknown action")
+    if action != "process":
+        return _error("Unknown action")
+    with progress_scope(data), profile_scope(data, _profile_dump_dir(data)) as timer:
+        resp = handle_process(data)
+    if timer is not None:
+        resp.update(timer.report())
+    return resp
 
 
 def main():
@@ -6,17 +6,33 @@ sitemap JSON files using the configured templates.
 """
 import copy
 import csv
-import io
 import json
+import multiprocessing
 import os
 import re
 import sys
 import traceback
 import zipfile
 import shutil
+from json.encoder import encode_basestring_ascii
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+# Shared helpers live in Engines/Common; frozen builds bundle them.
+if not getattr(sys, "frozen", False):
+    _COMMON_DIR = str(Path(__file__).resolve().parent.parent / "Common")
+    if _COMMON_DIR not in sys.path:
+        sys.path.append(_COMMON_DIR)
+
+from engine_support import (
+    ProgressReporter, progress_scope,
+    profile_count,
+    profile_phase,
+    profile_scope,
+)
+from xlsx_rows import open_xlsx_rows
+
 TEMPLATE_TIENDAS = "PlantillaSitemapsTiendas.json"
 TEMPLATE_BBVS = "PlantillaSitemapsBBvs.json"
 
@@ -26,6 +42,17 @@ STORES_BBVS = {"bbvs_template", "bbvsbb2_2da", "bbvsbb2"}
 SITEMAP_ID_ALLOWED_RE = re.compile(r"[^a-zA-Z0-9_()+-]")
 URL_RE = re.compile(r'https?://[^\s"\']+', re.IGNORECASE)
 
+DEFAULT_WORKERS = 1
+
+# Sitemaps are written in chunks of this many URLs.
+URL_WRITE_CHUNK = 65536
+_ID_MARKER = "\x00s3tools_id\x00"
+_URLS_MARKER = "\x00s3tools_start_url\x00"
+
+_TEMPLATE_CACHE = {}
+# id(template) -> (template, fragments) for templates already split.
+_TEMPLATE_FRAGMENTS = {}
+
 
 def _app_dir():
     return Path(getattr(sys, "_MEIPASS", Path(__file__).resolve().parent))
@@ -72,12 +99,16 @@ def select_template(store):
 
 
 def load_template(template_name):
+    if template_name in _TEMPLATE_CACHE:
+        return _TEMPLATE_CACHE[template_name]
     template_path = Path(template_name)
     if not template_path.exists():
         template_path = _app_dir() / template_name
     if not template_path.exists():
         raise FileNotFoundError(f"Sitemap template not found: {template_path}")
-    return json.loads(template_path.read_text(encoding="utf-8"))
+    template = json.loads(template_path.read_text(encoding="utf-8"))
+    _TEMPLATE_CACHE[template_name] = template
+    return template
 
 
 def read_text_fallback(path):
@@ -107,30 +138,162 @@ def read_urls_from_text(path):
     return extract_urls_from_text(read_text_fallback(path))
 
 
-def read_urls_from_csv(path):
-    text = read_text_fallback(path)
-    if not text.strip():
-        return []
+CSV_SAMPLE_CHARS = 4096
 
-    sample = text[:4096]
+
+def detect_csv_delimiter(sample):
     try:
-        dialect = csv.Sniffer().sniff(sample, delimiters=";\t,|")
-        delimiter = dialect.delimiter
+        return csv.Sniffer().sniff(sample, delimiters=";\t,|").delimiter
     except Exception:
         if ";" in sample and "," not in sample:
-            delimiter = ";"
-        elif "\t" in sample:
-            delimiter = "\t"
-        elif "|" in sample:
-            delimiter = "|"
-        else:
-            delimiter = ","
+            return ";"
+        if "\t" in sample:
+            return "\t"
+        if "|" in sample:
+            return "|"
+        return ","
+
+
+def _read_urls_from_csv_stream(path, encoding):
+    with open(path, "r", encoding=encoding) as f:
+        delimiter = detect_csv_delimiter(f.read(CSV_SAMPLE_CHARS))
+        f.seek(0)
+        urls = []
+        for row in csv.reader(f, delimiter=delimiter):
+            for cell in row:
+                # URL_RE needs "://", so most cells skip the regex.
+                if "://" in cell:
+                    urls.extend(URL_RE.findall(cell))
+        return urls
+
 
+def read_urls_from_csv(path):
+    """Read URLs from a CSV file, streaming it row by row.
+
+    The file is decoded once as UTF-8 (latin-1 if that fails) and the
+    delimiter is sniffed from the first CSV_SAMPLE_CHARS characters.
+    """
+    try:
+        return _read_urls_from_csv_stream(path, "utf-8-sig")
+    except UnicodeDecodeError:
+        return _read_urls_from_csv_stream(path, "latin-1")
+
+
+JSON_READ_CHARS = 1024 * 1024
+# One JSON token per match, skipping commas: a string (group 1, group 2 set
+# when it is an object key), a bracket (group 3) or a bare literal (group 4).
+JSON_TOKEN_RE = re.compile(r'[\s,]*(?:("(?:[^"\\]|\\.)*")(\s*:)?|([{}\[\]])|([^\s{}\[\],:"]+))')
+# A run of escape-free strings inside an array: URL_RE stops at quotes, so
+# it can scan the raw run at once.
+JSON_STRING_RUN_RE = re.compile(r'(?:[\s,]*"[^"\\]*")+')
+NON_SPACE_RE = re.compile(r"\S")
+# Keys whose URLs come first, in this order, within an object.
+JSON_URL_KEYS = ("startUrl", "start_url", "url")
+
+
+class _JsonFrame:
+    """URLs collected inside one open object or array."""
+
+    __slots__ = ("is_object", "key", "urls", "keyed")
+
+    def __init__(self, is_object):
+        self.is_object = is_object
+        self.key = None
+        self.urls = []
+        self.keyed = {k: [] for k in JSON_URL_KEYS} if is_object else None
+
+    def target(self):
+        if self.is_object and self.key in self.keyed:
+            return self.keyed[self.key]
+        return self.urls
+
+    def collected(self):
+        if not self.is_object:
+            return self.urls
+        out = []
+        for key in JSON_URL_KEYS:
+            out.extend(self.keyed[key])
+        out.extend(self.urls)
+        return out
+
+
+def _json_string_urls(token):
+    if "\\" in token:
+        token = json.loads(token)
+    elif "://" not in token:
+        return ()
+    return URL_RE.findall(token)
+
+
+def extract_urls_from_json_stream(f):
+    """Return URLs from string values of a JSON document read from f in chunks.
+
+    Objects list their startUrl/start_url/url values first, then the rest in
+    file order. Nesting uses an explicit stack, so depth is not limited by
+    recursion and the document is never held in memory as a whole.
+    """
     urls = []
-    reader = csv.reader(io.StringIO(text), delimiter=delimiter)
-    for row in reader:
+    stack = []
+    buf = ""
+    while True:
+        chunk = f.read(JSON_READ_CHARS)
+        eof = not chunk
+        buf += chunk
+        pos = 0
+        size = len(buf)
+        while pos < size:
+            if stack and not stack[-1].is_object:
+                m = JSON_STRING_RUN_RE.match(buf, pos)
+                if m is not None:
+                    stack[-1].urls.extend(URL_RE.findall(buf, pos, m.end()))
+                    pos = m.end()
+                    continue
+            m = JSON_TOKEN_RE.match(buf, pos)
+            if m is None:
+                break
+            if not eof and NON_SPACE_RE.search(buf, m.end()) is None:
+                # The token (or a key's colon) may continue in the next chunk.
+                break
+            pos = m.end()
+            string, is_key, bracket = m.group(1), m.group(2), m.group(3)
+            if string is not None:
+                if is_key:
+                    if not stack or not stack[-1].is_object:
+                        raise ValueError("Invalid JSON: unexpected key")
+                    stack[-1].key = json.loads(string) if "\\" in string else string[1:-1]
+                    continue
+                found = _json_string_urls(string)
+                if found:
+                    (stack[-1].target() if stack else urls).extend(found)
+            elif bracket in ("{", "["):
+                stack.append(_JsonFrame(bracket == "{"))
+            elif bracket is not None:
+                if not stack or stack[-1].is_object != (bracket == "}"):
+                    raise ValueError("Invalid JSON: unbalanced brackets")
+                found = stack.pop().collected()
+                (stack[-1].target() if stack else urls).extend(found)
+        buf = buf[pos:]
+        if eof:
+            if buf.strip() or stack:
+                raise ValueError("Invalid JSON: unexpected end of data")
+            return urls
+
+
+def read_urls_from_json(path):
+    try:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            return extract_urls_from_json_stream(f)
+    except UnicodeDecodeError:
+        with open(path, "r", encoding="latin-1") as f:
+            return extract_urls_from_json_stream(f)
+
+
+def _urls_from_rows(rows, urls):
+    for row in rows:
         for cell in row:
-            cleaned = str(cell or "").strip()
+            if cell is None:
+                continue
+            cleaned = str(cell).strip()
             if not cleaned:
                 continue
             if cleaned.lower() in ("start_url", "starturl"):
@@ -138,47 +301,12 @@ def read_urls_from_csv(path):
             matches = URL_RE.findall(cleaned)
             if matches:
                 urls.extend(matches)
-    return urls
-
-
-def _extract_urls_from_json_value(value, urls):
-    if isinstance(value, str):
-        matches = URL_RE.findall(value)
-        if matches:
-            urls.extend(matches)
-        return
-
-    if isinstance(value, list):
-        for item in value:
-            _extract_urls_from_json_value(item, urls)
-        return
-
-    if isinstance(value, dict):
-        if "startUrl" in value:
-            _extract_urls_from_json_value(value["startUrl"], urls)
-        if "start_url" in value:
-            _extract_urls_from_json_value(value["start_url"], urls)
-        if "url" in value:
-            _extract_urls_from_json_value(value["url"], urls)
-        for key, val in value.items():
-            if key in ("startUrl", "start_url", "url"):
-                continue
-            _extract_urls_from_json_value(val, urls)
 
 
-def read_urls_from_json(path):
-    text = read_text_fallback(path)
-    if not text.strip():
-        return []
-    payload = json.loads(text)
-    urls = []
-    _extract_urls_from_json_value(payload, urls)
-    return urls
-
-
-def read_urls_from_excel(path):
+def _read_urls_from_excel_openpyxl(path):
     try:
-        from openpyxl import load_workbook
+        with profile_phase("import"):
+            from openpyxl import load_workbook
     except Exception as exc:
         raise RuntimeError("openpyxl is required to read .xlsx files") from exc
 
@@ -186,23 +314,26 @@ def read_urls_from_excel(path):
     wb = load_workbook(path, read_only=True, data_only=True)
     try:
         for ws in wb.worksheets:
-            for row in ws.iter_rows(values_only=True):
-                for cell in row:
-                    if cell is None:
-                        continue
-                    cleaned = str(cell).strip()
-                    if not cleaned:
-                        continue
-                    if cleaned.lower() in ("start_url", "starturl"):
-                        continue
-                    matches = URL_RE.findall(cleaned)
-                    if matches:
-                        urls.extend(matches)
+            _urls_from_rows(ws.iter_rows(values_only=True), urls)
     finally:
         wb.close()
     return urls
 
 
+def read_urls_from_excel(path):
+    """Read URLs from every sheet, parsing the sheet XML directly.
+
+    Workbooks the direct reader cannot open go through openpyxl.
+    """
+    try:
+        rows = open_xlsx_rows(path)
+    except Exception:
+        return _read_urls_from_excel_openpyxl(path)
+    urls = []
+    _urls_from_rows(rows, urls)
+    return urls
+
+
 def read_urls_from_file(path):
     """Read URLs from txt/csv/xlsx/json based on file extension."""
     ext = Path(path).suffix.lower()
@@ -224,6 +355,187 @@ def build_sitemap_payload(title, urls, template):
     return payload
 
 
+def template_fragments(template):
+    """Split a template's compact JSON around its ``_id`` and ``startUrl`` values.
+
+    Returns a list of literal strings and the markers "_id"/"startUrl" in
+    output order; computed once per template.
+    """
+    cached = _TEMPLATE_FRAGMENTS.get(id(template))
+    if cached is not None and cached[0] is template:
+        return cached[1]
+    text = json.dumps(
+        build_sitemap_payload(_ID_MARKER, _URLS_MARKER, template), ensure_ascii=True, separators=(",", ":")
+    )
+    markers = {encode_basestring_ascii(_ID_MARKER): "_id", encode_basestring_ascii(_URLS_MARKER): "startUrl"}
+    fragments = []
+    pos = 0
+    while True:
+        found = [hit for hit in ((text.find(m, pos), m) for m in markers) if hit[0] >= 0]
+        if not found:
+            break
+        at, marker = min(found)
+        fragments.extend([text[pos:at], markers[marker]])
+        pos = at + len(marker)
+    fragments.append(text[pos:])
+    _TEMPLATE_FRAGMENTS[id(template)] = (template, fragments)
+    return fragments
+
+
+def write_sitemap(f, title, urls, template):
+    """Write one sitemap as compact ASCII JSON to an open text file.
+
+    The template is serialised once; each sitemap only encodes its id and
+    URLs, so the output matches json.dump of build_sitemap_payload.
+    """
+    for fragment in template_fragments(template):
+        if fragment == "_id":
+            f.write(encode_basestring_ascii(title))
+        elif fragment == "startUrl":
+            f.write("[")
+            for start in range(0, len(urls), URL_WRITE_CHUNK):
+                if start:
+                    f.write(",")
+                f.write(",".join(map(encode_basestring_ascii, urls[start:start + URL_WRITE_CHUNK])))
+            f.write("]")
+        else:
+            f.write(fragment)
+
+
+def part_sizes(total, parts):
+    """Split ``total`` URLs into ``parts`` consecutive sizes differing by at most one."""
+    parts = max(1, min(parts, total))
+    base, extra = divmod(total, parts)
+    return [base + 1] * extra + [base] * (parts - extra)
+
+
+def parts_needed(total, max_urls):
+    """Number of sitemaps needed to keep each under ``max_urls`` (0: no cap)."""
+    return -(-total // max_urls) if max_urls else 1
+
+
+def claim_title(title, used, idx):
+    """Return ``title``, or ``<title>_<idx>`` (then ``_2``, ...) when taken.
+
+    The returned id is added to ``used``.
+    """
+    candidate = title
+    n = 1
+    while candidate in used:
+        candidate = f"{title}_{idx}" if n == 1 else f"{title}_{idx}_{n}"
+        n += 1
+    used.add(candidate)
+    return candidate
+
+
+def split_titles(titles, counts, max_urls):
+    """Return the sitemap ids for each input once URL counts are known.
+
+    Inputs within ``max_urls`` keep their title; larger ones get
+    ``<title>_<part>`` ids, claimed after every kept title so a part never
+    overwrites another input's sitemap or another part.
+    """
+    parts = [parts_needed(count, max_urls) for count in counts]
+    used = {title for title, n in zip(titles, parts) if n == 1}
+    names = []
+    for idx, (title, n) in enumerate(zip(titles, parts), start=1):
+        if n == 1:
+            names.append([title])
+        else:
+            names.append([claim_title(f"{title}_{part}", used, idx) for part in range(1, n + 1)])
+    return names
+
+
+def write_sitemap_parts(urls, sizes, names, folder, template):
+    """Write ``urls`` as consecutive sitemaps of the given sizes and ids.
+
+    Returns the written paths.
+    """
+    outputs = []
+    start = 0
+    for name, size in zip(names, sizes):
+        part_path = Path(folder) / f"{name}.json"
+        with part_path.open("w", encoding="utf-8") as f:
+            write_sitemap(f, name, urls[start:start + size], template)
+        outputs.append(str(part_path))
+        start += size
+    return outputs
+
+
+def read_url_file(fp):
+    """Read one input file; returns (urls, error). Runs in pool workers too."""
+    try:
+        with profile_phase("read"):
+            urls = read_urls_from_file(fp)
+    except Exception as exc:
+        return [], f"Failed to read {fp}: {exc}"
+    if not urls:
+        return [], f"No URLs found in: {fp}"
+    return urls, ""
+
+
+def render_sitemap_file(fp, out_path, title, template_name):
+    """Read one input file and write its sitemap; returns (url count, error).
+
+    Runs in pool workers too, so failures come back as messages.
+    """
+    urls, error = read_url_file(fp)
+    if error:
+        return 0, error
+    with profile_phase("write"):
+        template = load_template(template_name)
+        with Path(out_path).open("w", encoding="utf-8") as f:
+            write_sitemap(f, title, urls, template)
+    return len(urls), ""
+
+
+def _parse_workers(data):
+    try:
+        workers = int(data.get("workers") or DEFAULT_WORKERS)
+    except Exception:
+        return DEFAULT_WORKERS
+    return max(1, min(workers, os.cpu_count() or 1))
+
+
+def _parse_max_urls(data):
+    try:
+        return max(0, int(data.get("max_urls_per_sitemap") or 0))
+    except Exception:
+        return 0
+
+
+def _map_inputs(func, workers, *args):
+    """Yield func(*job) over zipped argument lists in order, pooled when useful.
+
+    With more than one worker the files are read and written on a process
+    pool, since URL extraction is CPU-bound.
+    """
+    jobs = list(zip(*args))
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield func(*job)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        yield from pool.map(func, *args)
+
+
+def render_sitemaps(jobs, template_name, workers=DEFAULT_WORKERS):
+    """Yield (url count, error) per (input, output, title) job in job order."""
+    yield from _map_inputs(
+        render_sitemap_file,
+        workers,
+        [j[0] for j in jobs],
+        [str(j[1]) for j in jobs],
+        [j[2] for j in jobs],
+        [template_name] * len(jobs),
+    )
+
+
+def read_url_files(input_files, workers=DEFAULT_WORKERS):
+    """Yield (urls, error) per input file in order."""
+    yield from _map_inputs(read_url_file, workers, list(input_files))
+
+
 def ensure_folder(path):
     Path(path).mkdir(parents=True, exist_ok=True)
 
@@ -279,7 +591,7 @@ def handle_process(data):
         base_label = f"{store_label}_{base_name}" if store_label else base_name
 
     template_name = select_template(store_label)
-    template = load_template(template_name)
+    load_template(template_name)
 
     ddmmaa = datetime.now().strftime("%d%m%y")
     hhmm = datetime.now().strftime("%H%M")
@@ -287,19 +599,15 @@ def handle_process(data):
     work_dir = Path(output_dir) / folder_name
     ensure_folder(str(work_dir))
 
+    # Titles depend only on the input list, so they are fixed before any
+    # file is read and stay the same with parallel workers.
     base_id = sanitize_sitemap_id(base_label)
     total = len(input_files)
     output_files = []
     used_titles = set()
 
+    jobs = []
     for idx, fp in enumerate(input_files, start=1):
-        try:
-            urls = read_urls_from_file(fp)
-        except Exception as exc:
-            return _error(f"Failed to read {fp}: {exc}")
-        if not urls:
-            return _error(f"No URLs found in: {fp}")
-
         suffix = extract_trailing_number(fp)
         if suffix:
             title = f"{base_id}_{suffix}"
@@ -308,21 +616,62 @@ def handle_process(data):
         else:
             title = base_id
 
-        if title in used_titles:
-            title = f"{title}_{idx}"
-        used_titles.add(title)
-
-        out_path = work_dir / f"{title}.json"
-        payload = build_sitemap_payload(title, urls, template)
-        with out_path.open("w", encoding="utf-8") as f:
-            json.dump(payload, f, ensure_ascii=True, separators=(",", ":"))
-        output_files.append(str(out_path))
+        title = claim_title(title, used_titles, idx)
+        jobs.append((fp, work_dir / f"{title}.json", title))
+
+    workers = _parse_workers(data)
+    max_urls = _parse_max_urls(data)
+    rebalance = bool(data.get("rebalance_sitemaps"))
+    progress = ProgressReporter("sitemaps", sum(Path(fp).stat().st_size for fp in input_files))
+    if rebalance or max_urls:
+        # Part ids depend on URL counts, so every file is read (on the pool)
+        # before any id is handed out; the sitemaps are written afterwards.
+        url_lists = []
+        results = read_url_files(input_files, workers)
+        for fp, (urls, error) in zip(input_files, results):
+            if error:
+                results.close()
+                return _error(error)
+            profile_count("input_bytes", Path(fp).stat().st_size)
+            profile_count("input_rows", len(urls))
+            url_lists.append(urls)
+            progress.add(len(urls), Path(fp).stat().st_size)
+        if rebalance:
+            # All URLs are pooled in input order and cut into equal sitemaps:
+            # one per input file, or as many as max_urls_per_sitemap needs.
+            all_urls = [url for urls in url_lists for url in urls]
+            sizes = part_sizes(len(all_urls), parts_needed(len(all_urls), max_urls) if max_urls else total)
+            names = [base_id] if len(sizes) == 1 else [f"{base_id}_{n}" for n in range(1, len(sizes) + 1)]
+            writes = [(all_urls, sizes, names)]
+        else:
+            titles = [job[2] for job in jobs]
+            counts = [len(urls) for urls in url_lists]
+            writes = [
+                (urls, part_sizes(len(urls), len(names)), names)
+                for urls, names in zip(url_lists, split_titles(titles, counts, max_urls))
+            ]
+        with profile_phase("write"):
+            template = load_template(template_name)
+            for urls, sizes, names in writes:
+                output_files.extend(write_sitemap_parts(urls, sizes, names, work_dir, template))
+    else:
+        results = render_sitemaps(jobs, template_name, workers)
+        for (fp, out_path, _), (count, error) in zip(jobs, results):
+            if error:
+                results.close()
+                return _error(error)
+            profile_count("input_bytes", Path(fp).stat().st_size)
+            profile_count("input_rows", count)
+            output_files.append(str(out_path))
+            progress.add(count, Path(fp).stat().st_size)
+    progress.finish()
 
     zip_path = ""
     zip_out = bool(data.get("zip_output"))
     if zip_out:
         zip_path = str(Path(output_dir) / f"{sanitize_folder_name(base_label)}.zip")
-        zip_outputs(output_files, zip_path)
+        with profile_phase("zip"):
+            zip_outputs(output_files, zip_path)
         try:
             shutil.rmtree(work_dir)
         except Exception:
@@ -338,9 +687,14 @@ def handle_process(data):
 
 def handle_request(data):
     action = (data.get("action") or "").strip().lower()
-    if action == "process":
-        return handle_process(data)
-    return _error("Unknown action")
+    if action != "process":
+        return _error("Unknown action")
+    dump_dir = (data.get("output_dir") or "").strip() or str(Path.home() / "Downloads")
+    with progress_scope(data), profile_scope(data, dump_dir) as timer:
+        resp = handle_process(data)
+    if timer is not None:
+        resp.update(timer.report())
+    return resp
 
 
 def main():
@@ -357,4 +711,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
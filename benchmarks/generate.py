@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""Synthetic input generators for the engine benchmarks.
+
+Every generator is deterministic for a given ``seed`` so results can be
+compared between commits. Files are written in chunks to keep memory flat
+at 10M rows.
+"""
+import csv
+import json
+import random
+import string
+from pathlib import Path
+
+ENGINES_DIR = Path(__file__).resolve().parent.parent / "Engines"
+TEMPLATE_FILES = {
+    "tiendas": ENGINES_DIR / "Sitemap" / "PlantillaSitemapsTiendas.json",
+    "bbvs": ENGINES_DIR / "Sitemap" / "PlantillaSitemapsBBvs.json",
+}
+
+XLSX_MAX_ROWS = 1048575
+CHUNK_ROWS = 50000
+DUPLICATE_RATIO = 0.1
+URL_PREFIX = "https://www.amazon.com/dp/"
+URL_SUFFIX = "?th=1"
+INVENTORY_REPORT_NAME = "Reporte+de+inventario+01-01-2024"
+
+_ASIN_CHARS = string.ascii_uppercase + string.digits
+
+
+def parse_size(value):
+    """Parse row counts such as ``10k``, ``1m`` or ``2500``."""
+    text = str(value).strip().lower()
+    scale = 1
+    if text.endswith("k"):
+        scale, text = 1000, text[:-1]
+    elif text.endswith("m"):
+        scale, text = 1000000, text[:-1]
+    return int(float(text) * scale)
+
+
+def size_label(rows):
+    if rows % 1000000 == 0:
+        return f"{rows // 1000000}m"
+    if rows % 1000 == 0:
+        return f"{rows // 1000}k"
+    return str(rows)
+
+
+def iter_asins(rows, seed=0, duplicate_ratio=DUPLICATE_RATIO):
+    """Yield ``rows`` ASINs; about ``duplicate_ratio`` of them repeat earlier ones."""
+    rng = random.Random(seed)
+    recent = []
+    for _ in range(rows):
+        if recent and rng.random() < duplicate_ratio:
+            yield rng.choice(recent)
+            continue
+        asin = "B0" + "".join(rng.choices(_ASIN_CHARS, k=8))
+        if len(recent) < 65536:
+            recent.append(asin)
+        else:
+            recent[rng.randrange(65536)] = asin
+        yield asin
+
+
+def _chunks(iterable, size=CHUNK_ROWS):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _to_url(asin):
+    return f"{URL_PREFIX}{asin}{URL_SUFFIX}"
+
+
+def write_inventory_txt(path, rows, seed=0):
+    """Tab-separated inventory report with an ``asin`` column.
+
+    SKUs are unique per row, so reading the wrong column shows up as
+    zero duplicates.
+    """
+    rng = random.Random(seed + 1)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("sku\tasin\tprice\tquantity\n")
+        for chunk in _chunks(enumerate(iter_asins(rows, seed), start=1)):
+            f.write("".join(
+                f"SKU-{idx}\t{asin}\t{rng.randrange(100, 99999) / 100:.2f}\t{rng.randrange(0, 50)}\n"
+                for idx, asin in chunk
+            ))
+    return rows
+
+
+def write_plain_txt(path, rows, seed=0):
+    """One ASIN per line."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in _chunks(iter_asins(rows, seed)):
+            f.write("\n".join(chunk) + "\n")
+    return rows
+
+
+def _require_openpyxl():
+    try:
+        from openpyxl import Workbook
+    except Exception as exc:
+        raise RuntimeError("openpyxl is required to generate .xlsx inputs") from exc
+    return Workbook
+
+
+def write_inventory_xlsx(path, rows, seed=0):
+    """Inventory report as .xlsx; capped at the sheet row limit."""
+    Workbook = _require_openpyxl()
+    rows = min(rows, XLSX_MAX_ROWS)
+    rng = random.Random(seed + 1)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["sku", "asin", "price", "quantity"])
+    for idx, asin in enumerate(iter_asins(rows, seed), start=1):
+        ws.append([f"SKU-{idx}", asin, rng.randrange(100, 99999) / 100, rng.randrange(0, 50)])
+    wb.save(path)
+    return rows
+
+
+def write_url_batch(path, rows, seed=0):
+    """URL batch as .txt, .csv (``start_url`` column) or .json (``startUrl`` list)."""
+    ext = Path(path).suffix.lower()
+    asins = iter_asins(rows, seed, duplicate_ratio=0)
+    if ext == ".json":
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"startUrl":[')
+            first = True
+            for chunk in _chunks(asins):
+                body = ",".join(json.dumps(_to_url(a)) for a in chunk)
+                f.write(body if first else "," + body)
+                first = False
+            f.write("]}")
+        return rows
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if ext == ".csv":
+            f.write("start_url\n")
+        for chunk in _chunks(asins):
+            f.write("".join(_to_url(a) + "\n" for a in chunk))
+    return rows
+
+
+def webscraper_headers(template_key):
+    """Export headers WebScraper produces for a sitemap template."""
+    template = json.loads(TEMPLATE_FILES[template_key].read_text(encoding="utf-8"))
+    headers = ["web-scraper-order", "web-scraper-start-url"]
+    for selector in template.get("selectors", []):
+        if "elementclick" in str(selector.get("type") or "").lower():
+            continue
+        if selector.get("id"):
+            headers.append(str(selector["id"]))
+    return headers
+
+
+def _iter_export_rows(rows, template_key, seed):
+    rng = random.Random(seed + 2)
+    width = len(webscraper_headers(template_key)) - 2
+    for idx, asin in enumerate(iter_asins(rows, seed, duplicate_ratio=0), start=1):
+        values = [
+            f"${rng.randrange(100, 99999) / 100:.2f}" if rng.random() < 0.5 else ""
+            for _ in range(width)
+        ]
+        yield [f"1700000000-{idx}", _to_url(asin)] + values
+
+
+def write_webscraper_export(path, rows, template_key="tiendas", seed=0):
+    """WebScraper export (.csv or .xlsx) with the template's selector columns."""
+    headers = webscraper_headers(template_key)
+    if Path(path).suffix.lower() == ".xlsx":
+        Workbook = _require_openpyxl()
+        rows = min(rows, XLSX_MAX_ROWS)
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(headers)
+        for row in _iter_export_rows(rows, template_key, seed):
+            ws.append(row)
+        wb.save(path)
+        return rows
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        for chunk in _chunks(_iter_export_rows(rows, template_key, seed)):
+            writer.writerows(chunk)
+    return rows
+
+
+# name -> (file suffix, writer)
+GENERATORS = {
+    "inventory_txt": (".txt", write_inventory_txt),
+    "plain_txt": (".txt", write_plain_txt),
+    "inventory_xlsx": (".xlsx", write_inventory_xlsx),
+    "urls_txt": (".txt", write_url_batch),
+    "urls_csv": (".csv", write_url_batch),
+    "urls_json": (".json", write_url_batch),
+    "export_tiendas_csv": (".csv", lambda p, r, seed=0: write_webscraper_export(p, r, "tiendas", seed)),
+    "export_tiendas_xlsx": (".xlsx", lambda p, r, seed=0: write_webscraper_export(p, r, "tiendas", seed)),
+    "export_bbvs_csv": (".csv", lambda p, r, seed=0: write_webscraper_export(p, r, "bbvs", seed)),
+    "export_bbvs_xlsx": (".xlsx", lambda p, r, seed=0: write_webscraper_export(p, r, "bbvs", seed)),
+}
+
+
+def ensure_input(data_dir, name, rows, seed=0):
+    """Generate (or reuse) one input file; returns (path, rows written).
+
+    Inventory inputs carry the Seller Central report name so the engine
+    takes its inventory path; each size/seed gets its own folder.
+    """
+    suffix, writer = GENERATORS[name]
+    data_dir = Path(data_dir)
+    if name.startswith("inventory_"):
+        data_dir = data_dir / f"{name}_{size_label(rows)}_s{seed}"
+        path = data_dir / f"{INVENTORY_REPORT_NAME}{suffix}"
+    else:
+        path = data_dir / f"{name}_{size_label(rows)}_s{seed}{suffix}"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    meta_path = path.with_name(path.name + ".rows")
+    if path.is_file() and meta_path.is_file():
+        return path, int(meta_path.read_text())
+    written = writer(str(path), rows, seed=seed)
+    meta_path.write_text(str(written))
+    return path, written
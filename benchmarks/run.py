@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""Engine benchmark runner.
+
+Generates synthetic inputs (see ``generate.py``), times the engines and
+writes a JSON results file that ``--compare`` can diff between commits.
+
+Every measurement runs in its own Python process so peak RSS belongs to
+that case alone.
+
+    python benchmarks/run.py --sizes 10k,1m --out results/base.json
+    python benchmarks/run.py --compare results/base.json results/new.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BENCH_DIR.parent
+ENGINES_DIR = ROOT_DIR / "Engines"
+DEFAULT_DATA_DIR = BENCH_DIR / "data"
+DEFAULT_RESULTS_DIR = BENCH_DIR / "results"
+DEFAULT_SIZES = "10k"
+DEFAULT_REPEAT = 3
+DEFAULT_WARM_REQUESTS = 5
+STARTUP_ROWS = 10000
+
+ENGINE_SCRIPTS = {
+    "asin_batcher": ENGINES_DIR / "AsinBatcherEngine" / "engine.py",
+    "sitemap": ENGINES_DIR / "Sitemap" / "form_site.py",
+    "formato": ENGINES_DIR / "Formato" / "format.py",
+}
+HOST_SCRIPT = ENGINES_DIR / "EngineHost" / "host.py"
+ENGINE_MODULES = {
+    "asin_batcher": "engine",
+    "sitemap": "form_site",
+    "formato": "format",
+}
+
+# name -> (engine, call, generator input)
+CASES = {
+    "extract_plain_txt": ("asin_batcher", "extract", "plain_txt"),
+    "extract_inventory_txt": ("asin_batcher", "extract", "inventory_txt"),
+    "extract_inventory_xlsx": ("asin_batcher", "extract", "inventory_xlsx"),
+    "batcher_plain_txt": ("asin_batcher", "process", "plain_txt"),
+    "batcher_inventory_txt": ("asin_batcher", "process", "inventory_txt"),
+    "batcher_inventory_xlsx": ("asin_batcher", "process", "inventory_xlsx"),
+    "sitemap_urls_txt": ("sitemap", "process", "urls_txt"),
+    "sitemap_urls_csv": ("sitemap", "process", "urls_csv"),
+    "sitemap_urls_json": ("sitemap", "process", "urls_json"),
+    "formato_tiendas_csv": ("formato", "process", "export_tiendas_csv"),
+    "formato_tiendas_xlsx": ("formato", "process", "export_tiendas_xlsx"),
+    "formato_bbvs_csv": ("formato", "process", "export_bbvs_csv"),
+    "formato_bbvs_xlsx": ("formato", "process", "export_bbvs_xlsx"),
+}
+
+
+def peak_rss_bytes():
+    """Peak resident set size of the current process, or None."""
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return int(counters.PeakWorkingSetSize)
+        except Exception:
+            return None
+        return None
+    try:
+        import resource
+    except Exception:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=str(ROOT_DIR), capture_output=True, text=True, timeout=30,
+        )
+    except Exception:
+        return ""
+    return out.stdout.strip() if out.returncode == 0 else ""
+
+
+def _import_engine(engine):
+    path = str(ENGINE_SCRIPTS[engine].parent)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return __import__(ENGINE_MODULES[engine])
+
+
+def _request(engine, input_path, output_dir):
+    if engine == "asin_batcher":
+        return {
+            "action": "process",
+            "input_path": str(input_path),
+            "output_dir": str(output_dir),
+            "store": "ProductosTX",
+            "file_label": "bench",
+            "market": "US",
+            "batches": 30,
+            "use_cache": False,
+        }
+    if engine == "sitemap":
+        return {
+            "action": "process",
+            "input_files": [str(input_path)],
+            "output_dir": str(output_dir),
+            "store": "ProductosTX",
+            "base_name": "bench",
+        }
+    return {"action": "process", "input_files": [str(input_path)], "template": "auto"}
+
+
+def run_child(spec):
+    """Run one measurement in this process; returns the result record."""
+    engine, call = spec["engine"], spec["call"]
+    input_path = Path(spec["input_path"])
+    module = _import_engine(engine)
+    with tempfile.TemporaryDirectory(prefix="s3bench_") as workdir:
+        if engine == "formato":
+            # Formato rewrites its input, so each run gets a fresh copy.
+            target = Path(workdir) / input_path.name
+            shutil.copyfile(input_path, target)
+            input_path = target
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        if call == "extract":
+            uniques, dups = module.extract_asins_any(str(input_path))
+            resp = {"ok": True, "unique": len(uniques), "duplicates": len(dups)}
+        else:
+            resp = module.handle_process(_request(engine, input_path, Path(workdir) / "out"))
+        wall = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+    error = resp.get("error", "")
+    if resp.get("ok") and engine == "asin_batcher":
+        import generate
+
+        # Every generated row holds one ASIN and about DUPLICATE_RATIO of
+        # them repeat; other counts mean the input went through the wrong
+        # reader (e.g. the unique sku column) and the timing is meaningless.
+        unique, dups = resp.get("unique", 0), resp.get("duplicates", 0)
+        if unique + dups != spec["rows"] or dups < spec["rows"] * generate.DUPLICATE_RATIO / 2:
+            error = f"read {unique} unique + {dups} duplicate ASINs from {spec['rows']} generated rows"
+    return {
+        "ok": bool(resp.get("ok")) and not error,
+        "error": error,
+        "wall": wall,
+        "cpu": cpu,
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+
+def _spawn_child(spec):
+    proc = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--child"],
+        input=json.dumps(spec), capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"ok": False, "error": (proc.stderr.strip().splitlines() or ["child failed"])[-1]}
+    return json.loads(proc.stdout)
+
+
+def bench_case(name, input_path, rows, repeat):
+    engine, call, source = CASES[name]
+    spec = {"engine": engine, "call": call, "input_path": str(input_path), "rows": rows}
+    runs = [_spawn_child(spec) for _ in range(repeat)]
+    failed = [r for r in runs if not r.get("ok")]
+    record = {
+        "case": name,
+        "engine": engine,
+        "call": call,
+        "input": source,
+        "rows": rows,
+        "input_bytes": Path(input_path).stat().st_size,
+        "repeat": repeat,
+    }
+    if failed:
+        record["error"] = failed[0].get("error") or "engine request failed"
+        return record
+    walls = sorted(r["wall"] for r in runs)
+    best = walls[0]
+    record.update({
+        "wall_min": round(best, 6),
+        "wall_median": round(walls[len(walls) // 2], 6),
+        "cpu_min": round(min(r["cpu"] for r in runs), 6),
+        "rows_per_sec": round(rows / best, 1) if best > 0 else None,
+        "mb_per_sec": round(record["input_bytes"] / best / 1e6, 3) if best > 0 else None,
+        "peak_rss_bytes": max((r["peak_rss_bytes"] or 0) for r in runs) or None,
+    })
+    return record
+
+
+def _time_cold(engine, request):
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, str(ENGINE_SCRIPTS[engine])],
+        input=json.dumps(request), capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    try:
+        ok = json.loads(proc.stdout).get("ok")
+    except Exception:
+        ok = False
+    return wall, bool(ok)
+
+
+def _time_warm(engine, request, count):
+    proc = subprocess.Popen(
+        [sys.executable, str(HOST_SCRIPT), "--serve"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    walls = []
+    ok = True
+    try:
+        # The first request pays the module import; the rest run warm.
+        for idx in range(count + 1):
+            line = json.dumps({**request, "engine": engine, "id": idx}) + "\n"
+            started = time.perf_counter()
+            proc.stdin.write(line)
+            proc.stdin.flush()
+            resp = json.loads(proc.stdout.readline() or "{}")
+            if idx:
+                walls.append(time.perf_counter() - started)
+            ok = ok and bool(resp.get("ok"))
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    return walls, ok
+
+
+def bench_startup(engine, input_path, repeat, warm_requests):
+    """Cold process-per-request latency vs warm requests through the host."""
+    with tempfile.TemporaryDirectory(prefix="s3bench_") as workdir:
+        if engine == "formato":
+            target = Path(workdir) / Path(input_path).name
+            shutil.copyfile(input_path, target)
+            input_path = target
+        request = _request(engine, input_path, Path(workdir) / "out")
+        cold = [_time_cold(engine, request) for _ in range(repeat)]
+        warm, warm_ok = _time_warm(engine, request, warm_requests)
+    record = {"case": f"startup_{engine}", "engine": engine, "call": "startup", "rows": STARTUP_ROWS}
+    if not all(ok for _, ok in cold) or not warm_ok:
+        record["error"] = "engine request failed"
+        return record
+    cold_walls = sorted(w for w, _ in cold)
+    warm = sorted(warm)
+    record.update({
+        "cold_min": round(cold_walls[0], 6),
+        "cold_median": round(cold_walls[len(cold_walls) // 2], 6),
+        "warm_min": round(warm[0], 6),
+        "warm_median": round(warm[len(warm) // 2], 6),
+    })
+    return record
+
+
+def _startup_inputs(data_dir, seed):
+    import generate
+    return {
+        "asin_batcher": generate.ensure_input(data_dir, "plain_txt", STARTUP_ROWS, seed)[0],
+        "sitemap": generate.ensure_input(data_dir, "urls_txt", STARTUP_ROWS, seed)[0],
+        "formato": generate.ensure_input(data_dir, "export_tiendas_csv", STARTUP_ROWS, seed)[0],
+    }
+
+
+def run_suite(args):
+    sys.path.insert(0, str(BENCH_DIR))
+    import generate
+
+    sizes = [generate.parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    selected = [c for c in CASES if not args.cases or any(p in c for p in args.cases.split(","))]
+    results = []
+    for rows in sizes:
+        for name in selected:
+            source = CASES[name][2]
+            try:
+                input_path, written = generate.ensure_input(args.data_dir, source, rows, args.seed)
+            except RuntimeError as exc:
+                record = {"case": name, "rows": rows, "error": str(exc)}
+            else:
+                record = bench_case(name, input_path, written, args.repeat)
+            results.append(record)
+            _print_record(record)
+    if not args.skip_startup:
+        for engine, input_path in _startup_inputs(args.data_dir, args.seed).items():
+            record = bench_startup(engine, input_path, args.repeat, args.warm_requests)
+            results.append(record)
+            _print_record(record)
+
+    out_path = Path(args.out) if args.out else (
+        DEFAULT_RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{_git_commit() or 'local'}.json"
+    )
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        "commit": _git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "results": results,
+    }
+    out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"results: {out_path}")
+    return out_path
+
+
+def _print_record(record):
+    if record.get("error"):
+        print(f"{record['case']:<28} {record.get('rows', ''):>10}  ERROR {record['error']}")
+    elif record.get("call") == "startup":
+        print(f"{record['case']:<28} {'':>10}  cold {record['cold_median']:.3f}s  warm {record['warm_median']:.3f}s")
+    else:
+        rss = record.get("peak_rss_bytes") or 0
+        print(
+            f"{record['case']:<28} {record['rows']:>10}  {record['wall_min']:.3f}s  "
+            f"{record['rows_per_sec']:>12,.0f} rows/s  {rss / 1e6:8.1f} MB"
+        )
+
+
+def _result_key(record):
+    return record["case"], record.get("rows")
+
+
+def compare(base_path, new_path):
+    """Print new/base ratios for cases present in both results files."""
+    base = {_result_key(r): r for r in json.loads(Path(base_path).read_text(encoding="utf-8"))["results"]}
+    new = json.loads(Path(new_path).read_text(encoding="utf-8"))
+    for record in new["results"]:
+        old = base.get(_result_key(record))
+        if old is None or old.get("error") or record.get("error"):
+            continue
+        if record.get("call") == "startup":
+            metrics = ("cold_median", "warm_median")
+        else:
+            metrics = ("wall_min", "peak_rss_bytes")
+        parts = []
+        for metric in metrics:
+            if old.get(metric) and record.get(metric):
+                parts.append(f"{metric} x{record[metric] / old[metric]:.2f}")
+        print(f"{record['case']:<28} {record.get('rows') or '':>10}  " + "  ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated row counts, e.g. 10k,1m,10m")
+    parser.add_argument("--cases", default="", help="comma-separated substrings of case names to run")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--warm-requests", type=int, default=DEFAULT_WARM_REQUESTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=str(DEFAULT_DATA_DIR))
+    parser.add_argument("--out", default="")
+    parser.add_argument("--skip-startup", action="store_true")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"))
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.stdout.write(json.dumps(run_child(json.loads(sys.stdin.read()))))
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+    run_suite(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -35,14 +35,23 @@ if (Test-Path $globalTemplateDir) {
     $globalTemplates = Get-ChildItem -Path $globalTemplateDir -Filter *.json -File -ErrorAction SilentlyContinue
 }
 
-$scriptFiles = Get-ChildItem -Path $enginesDir -Recurse -Filter *.py -File |
+$sourceFiles = Get-ChildItem -Path $enginesDir -Recurse -Filter *.py -File |
     Where-Object { $_.FullName -notmatch '\\(build|dist|__pycache__)\\' }
 
+# Engines/Common only holds modules shared by the engines; it is bundled
+# through --paths but not built on its own.
+$scriptFiles = $sourceFiles |
+    Where-Object { $_.FullName -notmatch '\\Common\\' }
+
 if (-not $scriptFiles) {
     Write-Error ("No .py engines found under {0}" -f $enginesDir)
     exit 1
 }
 
+# Engine folders are added as import paths so the engine host can bundle
+# the engine modules it serves.
+$engineDirs = $sourceFiles | ForEach-Object { $_.DirectoryName } | Sort-Object -Unique
+
 foreach ($script in $scriptFiles) {
     $scriptDir = $script.DirectoryName
     $distPath = $scriptDir
@@ -83,6 +92,10 @@ foreach ($script in $scriptFiles) {
         "--specpath", $specPath
     )
 
+    foreach ($engineDir in $engineDirs) {
+        $args += ("--paths={0}" -f $engineDir)
+    }
+
     foreach ($entry in $dataEntries) {
         $parts = $entry -split '\|', 2
         $src = $parts[0]
@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+ENGINES = Path(__file__).resolve().parent.parent / "Engines"
+for folder in ("Common", "Sitemap", "AsinBatcherEngine"):
+    path = str(ENGINES / folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
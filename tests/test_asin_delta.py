@@ -0,0 +1,38 @@
+import engine
+
+
+def write_report(folder, name, asins):
+    path = folder / name
+    lines = ["sku\tasin\tprice"] + [f"S{i}\t{a}\t1" for i, a in enumerate(asins)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def delta(tmp_path, batches):
+    previous = write_report(tmp_path, "Reporte+de+inventario+01-01-2024.txt", [f"B{i:09d}" for i in range(100)])
+    current = write_report(tmp_path, "Reporte+de+inventario+02-01-2024.txt", [f"B{i:09d}" for i in range(40, 160)])
+    out = tmp_path / "out"
+    resp = engine.handle_delta({
+        "previous_path": previous,
+        "current_path": current,
+        "output_dir": str(out),
+        "store": "ProductosTX",
+        "market": "US",
+        "batches": batches,
+        "file_label": "delta",
+        "use_cache": False,
+    })
+    return resp, out
+
+
+def test_delta_writes_removed_csv(tmp_path):
+    resp, out = delta(tmp_path, 2)
+    assert resp["ok"], resp
+    assert (resp["added"], resp["removed"]) == (60, 40)
+    assert any(p.name.startswith("eliminados_") for p in out.iterdir())
+
+
+def test_delta_rejected_targets_write_nothing(tmp_path):
+    resp, out = delta(tmp_path, 500)
+    assert not resp["ok"]
+    assert list(out.iterdir()) == []
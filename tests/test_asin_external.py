@@ -0,0 +1,44 @@
+import random
+import string
+import tracemalloc
+
+import engine
+
+
+def write_plain(path, lines):
+    path.write_text("".join(lines), encoding="utf-8")
+    return str(path)
+
+
+def random_asins(n, seed=1):
+    rng = random.Random(seed)
+    alphabet = string.ascii_uppercase + string.digits
+    return ["".join(rng.choices(alphabet, k=10)) for _ in range(n)]
+
+
+def test_external_plain_txt_matches_in_memory(tmp_path):
+    asins = random_asins(50000)
+    asins += asins[:500]
+    lines = [a + ("\r\n" if i % 3 else "\n") for i, a in enumerate(asins)] + ["b0-x y\n", "\n", "short\n"]
+    path = write_plain(tmp_path / "plain.txt", lines)
+    uniques, dups = engine.extract_asins_any(path)
+    ext_uniques, ext_dups = engine.extract_asins_external(path, str(tmp_path), 1)
+    assert list(ext_uniques.to_array()) == list(uniques)
+    assert list(ext_dups.to_array()) == list(dups)
+
+
+def test_external_plain_txt_memory_is_bounded(tmp_path):
+    path = write_plain(tmp_path / "big.txt", [a + "\n" for a in random_asins(400000)])
+    tracemalloc.start()
+    try:
+        engine.extract_asins_external(path, str(tmp_path), 1)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # The file is 4.4 MB; holding it as strings took over 50 MB.
+    assert peak < 16 * 1024 * 1024
+
+
+def test_plain_txt_lines_stream_like_splitlines(tmp_path):
+    path = write_plain(tmp_path / "p.txt", ["a1\x0bb2\r\n", "\r", "c3"])
+    assert engine.read_asins_from_plain_txt(path) == ["A1", "B2", "C3"]
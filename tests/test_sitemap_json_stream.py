@@ -0,0 +1,68 @@
+import io
+import json
+
+import pytest
+
+import form_site
+
+DOCUMENTS = [
+    # Nested lists and objects, with the URL keys listed after other keys.
+    {
+        "sitemaps": [
+            {"_id": "a", "selectors": [{"id": "x", "note": "see https://n.com/1"}], "startUrl": ["https://a.com/1", "https://a.com/2"]},
+            {"url": "https://b.com/1", "start_url": "https://b.com/2 https://b.com/3", "extra": [[["https://deep.com/x"]]]},
+        ],
+        "startUrl": "https://top.com/",
+    },
+    # Escaped quotes, backslashes and unicode inside strings and keys.
+    [
+        "texto \"https://q.com/a\" fin",
+        "https://slash.com/p?x=1",
+        "https://u.com/café y https://u.com/ñandú",
+        {"k\"ey": "https://k.com/\\back", "url": "http://plain.com/?a=\"b\""},
+        "sin url",
+        12,
+        True,
+        None,
+        {"https://key-is-not-a-url.com/": 1.5e3, "url": None},
+    ],
+    # Long string runs and deep nesting that span many reads.
+    {"startUrl": [{"url": [f"https://long.com/{i}/" + "x" * 40 for i in range(30)]}], "n": [[[[[[["https://d.com/"]]]]]]]},
+    "https://bare.com/only",
+    {},
+    [],
+]
+
+
+def reference_urls(value, urls):
+    if isinstance(value, str):
+        urls.extend(form_site.URL_RE.findall(value))
+    elif isinstance(value, list):
+        for item in value:
+            reference_urls(item, urls)
+    elif isinstance(value, dict):
+        for key in form_site.JSON_URL_KEYS:
+            if key in value:
+                reference_urls(value[key], urls)
+        for key, item in value.items():
+            if key not in form_site.JSON_URL_KEYS:
+                reference_urls(item, urls)
+    return urls
+
+
+@pytest.mark.parametrize("read_chars", [1, 2, 3, 7, 64])
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("doc", DOCUMENTS)
+def test_stream_parser_matches_recursive_walker(monkeypatch, read_chars, indent, doc):
+    text = json.dumps(doc, indent=indent, ensure_ascii=indent is None)
+    monkeypatch.setattr(form_site, "JSON_READ_CHARS", read_chars)
+    expected = reference_urls(json.loads(text), [])
+    assert form_site.extract_urls_from_json_stream(io.StringIO(text)) == expected
+
+
+@pytest.mark.parametrize("read_chars", [1, 2, 5])
+def test_stream_parser_matches_on_raw_escapes(monkeypatch, read_chars):
+    text = r'{"a": ["https:\/\/s.com\/p", "x \"https://q.com/\" https://e.com/é"], "url": "https://k.com/\\"}'
+    monkeypatch.setattr(form_site, "JSON_READ_CHARS", read_chars)
+    expected = reference_urls(json.loads(text), [])
+    assert form_site.extract_urls_from_json_stream(io.StringIO(text)) == expected
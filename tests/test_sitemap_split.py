@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+
+import form_site
+
+
+def write_urls(folder, name, host, count):
+    path = Path(folder) / name
+    path.write_text("\n".join(f"https://{host}/{i}" for i in range(count)), encoding="utf-8")
+    return str(path)
+
+
+def run(tmp_path, input_files, **options):
+    data = {
+        "action": "process",
+        "input_files": input_files,
+        "output_dir": str(tmp_path / "out"),
+        "base_name": "X",
+    }
+    data.update(options)
+    resp = form_site.handle_process(data)
+    assert resp["ok"], resp
+    sitemaps = {}
+    for fp in resp["output_files"]:
+        payload = json.loads(Path(fp).read_text(encoding="utf-8"))
+        assert Path(fp).stem == payload["_id"]
+        sitemaps[payload["_id"]] = payload["startUrl"]
+    assert len(sitemaps) == len(resp["output_files"])
+    return sitemaps
+
+
+def test_split_keeps_small_files_and_even_parts(tmp_path):
+    files = [write_urls(tmp_path, "a_1.txt", "a.com", 25), write_urls(tmp_path, "b_2.txt", "b.com", 3)]
+    sitemaps = run(tmp_path, files, max_urls_per_sitemap=10)
+    assert {k: len(v) for k, v in sitemaps.items()} == {"X_1_1": 9, "X_1_2": 8, "X_1_3": 8, "X_2": 3}
+    assert sitemaps["X_1_1"] + sitemaps["X_1_2"] + sitemaps["X_1_3"] == [f"https://a.com/{i}" for i in range(25)]
+
+
+def test_split_parts_do_not_overwrite_other_inputs(tmp_path):
+    # Both inputs end in "_1": the second gets title X_1_2, which is also
+    # the id the first input's second part would take.
+    files = [write_urls(tmp_path, "a_1.txt", "a.com", 10), write_urls(tmp_path, "b_1.txt", "b.com", 4)]
+    sitemaps = run(tmp_path, files, max_urls_per_sitemap=5)
+    assert sitemaps["X_1_2"] == [f"https://b.com/{i}" for i in range(4)]
+    a_urls = [url for urls in sitemaps.values() for url in urls if "a.com" in url]
+    assert sorted(a_urls) == sorted(f"https://a.com/{i}" for i in range(10))
+    assert len(sitemaps) == 3
+
+
+def test_rebalance_across_inputs(tmp_path):
+    files = [write_urls(tmp_path, f"f{i}.txt", f"h{i}.com", n) for i, n in enumerate((10, 25, 3), start=1)]
+    sitemaps = run(tmp_path, files, rebalance_sitemaps=True)
+    assert [len(sitemaps[f"X_{n}"]) for n in (1, 2, 3)] == [13, 13, 12]
+    capped = run(tmp_path / "capped", files, rebalance_sitemaps=True, max_urls_per_sitemap=8)
+    assert [len(capped[f"X_{n}"]) for n in range(1, 6)] == [8, 8, 8, 7, 7]
@@ -0,0 +1,71 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+import engine
+import form_site
+
+TEMPLATES = [form_site.TEMPLATE_TIENDAS, form_site.TEMPLATE_BBVS]
+URL_CASES = [
+    ["https://www.amazon.com/dp/B000000001?th=1", "https://www.amazon.com/dp/B000000002?th=1"],
+    ["https://ejemplo.com.mx/camión/ñandú?q=\"año\"&x=\\u00e9", "https://x.com/ \U0001f600"],
+    [],
+]
+
+
+def reference(title, urls, template):
+    return json.dumps(
+        form_site.build_sitemap_payload(title, urls, template), ensure_ascii=True, separators=(",", ":")
+    )
+
+
+@pytest.mark.parametrize("template_name", TEMPLATES)
+@pytest.mark.parametrize("urls", URL_CASES)
+@pytest.mark.parametrize("title", ["ProductosTX_lote_1", 'Tienda "ñ" \\ 1'])
+def test_write_sitemap_matches_json_dump(template_name, urls, title):
+    template = form_site.load_template(str(Path(form_site.__file__).parent / template_name))
+    out = io.StringIO()
+    form_site.write_sitemap(out, title, urls, template)
+    assert out.getvalue() == reference(title, urls, template)
+
+
+def test_write_sitemap_matches_json_dump_across_chunks(monkeypatch):
+    template = form_site.load_template(str(Path(form_site.__file__).parent / form_site.TEMPLATE_TIENDAS))
+    urls = [f"https://a.com/{i}?n=é" for i in range(25)]
+    monkeypatch.setattr(form_site, "URL_WRITE_CHUNK", 4)
+    out = io.StringIO()
+    form_site.write_sitemap(out, "t", urls, template)
+    assert out.getvalue() == reference("t", urls, template)
+
+
+@pytest.mark.parametrize("store", ["ProductosTX", "BBvsBB2"])
+def test_sitemaps_action_matches_txt_round_trip(tmp_path, store):
+    source = tmp_path / "asins.txt"
+    source.write_text("\n".join(f"B0{i:08d}" for i in range(50)), encoding="utf-8")
+    request = {
+        "input_path": str(source),
+        "store": store,
+        "market": "US",
+        "batches": 3,
+        "file_label": "lote",
+        "use_cache": False,
+    }
+    direct = engine.handle_sitemaps(dict(request, output_dir=str(tmp_path / "direct")))
+    batches = engine.handle_process(dict(request, output_dir=str(tmp_path / "txt")))
+    assert direct["ok"] and batches["ok"]
+
+    txt_files = sorted(Path(batches["output_folder"]).glob("*.txt"))
+    round_trip = form_site.handle_process({
+        "input_files": [str(p) for p in txt_files],
+        "output_dir": str(tmp_path / "sitemap"),
+        "store": store,
+        "base_name": "lote",
+    })
+    assert round_trip["ok"], round_trip
+
+    direct_files = sorted(Path(direct["output_folder"]).glob("*.json"))
+    assert [p.name for p in direct_files] == [Path(p).name for p in round_trip["output_files"]]
+    for direct_file, sitemap_file in zip(direct_files, round_trip["output_files"]):
+        assert direct_file.read_bytes() == Path(sitemap_file).read_bytes()
@@ -0,0 +1,168 @@
+import zipfile
+
+import pytest
+
+import xlsx_rows
+from xlsx_rows import XlsxFormatError, open_xlsx_rows
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+
+def sheet(rows_xml, prefix=""):
+    p = f"{prefix}:" if prefix else ""
+    ns = f'xmlns:{prefix}="{MAIN_NS}"' if prefix else f'xmlns="{MAIN_NS}"'
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><{p}worksheet {ns}>'
+        f'<{p}dimension ref="A1"/><{p}sheetData>{rows_xml}</{p}sheetData></{p}worksheet>'
+    )
+
+
+def make_xlsx(path, sheets, shared=None):
+    """Write a minimal workbook with the given sheet XML parts."""
+    rels = [
+        f'<Relationship Id="rId{i}" Target="worksheets/sheet{i}.xml" '
+        f'Type="{REL_NS}/worksheet"/>'
+        for i in range(1, len(sheets) + 1)
+    ]
+    if shared is not None:
+        rels.append(f'<Relationship Id="rIdS" Target="sharedStrings.xml" Type="{REL_NS}/sharedStrings"/>')
+    entries = "".join(
+        f'<sheet name="S{i}" sheetId="{i}" r:id="rId{i}"/>' for i in range(1, len(sheets) + 1)
+    )
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("xl/workbook.xml", f'<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><sheets>{entries}</sheets></workbook>')
+        z.writestr("xl/_rels/workbook.xml.rels", f'<Relationships xmlns="{PKG_REL_NS}">{"".join(rels)}</Relationships>')
+        for i, xml in enumerate(sheets, start=1):
+            z.writestr(f"xl/worksheets/sheet{i}.xml", xml)
+        if shared is not None:
+            items = "".join(f"<si>{si}</si>" for si in shared)
+            z.writestr("xl/sharedStrings.xml", f'<sst xmlns="{MAIN_NS}">{items}</sst>')
+    return str(path)
+
+
+def read(path, **kwargs):
+    return list(open_xlsx_rows(path, **kwargs))
+
+
+def test_values_and_gaps(tmp_path):
+    path = make_xlsx(tmp_path / "a.xlsx", [sheet(
+        '<row r="1"><c r="A1" t="inlineStr"><is><t>start_url</t></is></c><c r="C1"><v>5</v></c></row>'
+        '<row r="3"><c r="A3" t="inlineStr"><is><t>a&amp;b</t></is></c><c r="B3"><v>1.5</v></c>'
+        '<c r="D3" t="b"><v>1</v></c></row>'
+        '<row r="4"/>'
+        '<row r="5"><c r="B5"><f>1+2</f><v/></c><c r="C5" t="str"><f>A1</f><v>x&lt;y</v></c></row>'
+    )])
+    assert read(path) == [
+        ("start_url", None, 5),
+        (),
+        ("a&b", 1.5, None, True),
+        (),
+        (None, None, "x<y"),
+    ]
+
+
+def test_shared_strings(tmp_path):
+    shared = [
+        "<t>http://a.com/?q=1&amp;r=2</t>",
+        '<r><rPr><b/></rPr><t xml:space="preserve">http://rich</t></r><r><t>.com/ü</t></r>'
+        '<rPh sb="0" eb="1"><t>PH</t></rPh>',
+        "<t/>",
+    ]
+    path = make_xlsx(tmp_path / "s.xlsx", [sheet(
+        '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c><c r="C1" t="s"><v>2</v></c></row>'
+    )], shared=shared)
+    assert read(path) == [("http://a.com/?q=1&r=2", "http://rich.com/ü", "")]
+
+
+def test_prefixed_tags_and_single_quotes(tmp_path):
+    path = make_xlsx(tmp_path / "p.xlsx", [sheet(
+        "<x:row r='2' spans='1:2'><x:c r='B2' t='inlineStr'><x:is><x:t>http://p.com</x:t></x:is></x:c></x:row>",
+        prefix="x",
+    )])
+    assert read(path) == [(), (None, "http://p.com")]
+
+
+def test_date_and_unparseable_cells_keep_text(tmp_path):
+    path = make_xlsx(tmp_path / "d.xlsx", [sheet(
+        '<row r="1"><c r="A1" t="d"><v>2024-01-02T00:00:00</v></c><c r="B1"><v>12abc</v></c></row>'
+        '<row r="2"><c r="A2" t="inlineStr"><is><t>after</t></is></c></row>'
+    )])
+    assert read(path) == [("2024-01-02T00:00:00", "12abc"), ("after",)]
+
+
+def test_small_chunks_match(tmp_path, monkeypatch):
+    rows = "".join(
+        f'<row r="{i}"><c r="A{i}" t="inlineStr"><is><t>http://x.com/{i}</t></is></c><c r="B{i}"><v>{i}</v></c></row>'
+        for i in range(1, 200)
+    )
+    path = make_xlsx(tmp_path / "c.xlsx", [sheet(rows)])
+    expected = read(path)
+    assert len(expected) == 199
+    monkeypatch.setattr(xlsx_rows, "XLSX_READ_BYTES", 64)
+    assert read(path) == expected
+
+
+def test_sheet_selection_and_empty_sheet(tmp_path):
+    first = sheet('<row r="1"><c r="A1"><v>1</v></c></row>')
+    empty = f'<worksheet xmlns="{MAIN_NS}"><sheetData/></worksheet>'
+    second = sheet('<row r="1"><c r="A1"><v>2</v></c></row>')
+    path = make_xlsx(tmp_path / "m.xlsx", [first, empty, second])
+    assert read(path) == [(1,), (2,)]
+    assert read(path, first_sheet_only=True) == [(1,)]
+
+
+def test_unreadable_workbook_raises_before_rows(tmp_path):
+    path = tmp_path / "bad.xlsx"
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("xl/workbook.xml", f'<workbook xmlns="{MAIN_NS}"><sheets/></workbook>')
+        z.writestr("xl/_rels/workbook.xml.rels", f'<Relationships xmlns="{PKG_REL_NS}"/>')
+    with pytest.raises(XlsxFormatError):
+        open_xlsx_rows(str(path))
+
+    missing = tmp_path / "missing.xlsx"
+    with zipfile.ZipFile(make_xlsx(tmp_path / "ok.xlsx", [sheet("")])) as src, zipfile.ZipFile(missing, "w") as z:
+        for name in src.namelist():
+            if not name.startswith("xl/worksheets/"):
+                z.writestr(name, src.read(name))
+    with pytest.raises(XlsxFormatError):
+        open_xlsx_rows(str(missing))
+
+
+def test_matches_openpyxl(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["a&b <x>", "https://x.com/?a=1&b=2", 3.25, -7, False, "  "])
+    ws["C5"] = "ünï"
+    wb.create_sheet("two")["B2"] = "http://z.com"
+    path = tmp_path / "o.xlsx"
+    wb.save(path)
+
+    def strip(row):
+        row = list(row)
+        while row and row[-1] is None:
+            row.pop()
+        return tuple(row)
+
+    ref = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    expected = [strip(r) for ws in ref.worksheets for r in ws.iter_rows(values_only=True)]
+    ref.close()
+    assert [strip(r) for r in read(str(path))] == expected
+
+
+def test_engines_read_past_date_cells(tmp_path):
+    import engine
+    import form_site
+
+    path = make_xlsx(tmp_path / "inv.xlsx", [sheet(
+        '<row r="1"><c r="A1" t="inlineStr"><is><t>asin</t></is></c>'
+        '<c r="B1" t="inlineStr"><is><t>url</t></is></c></row>'
+        '<row r="2"><c r="A2" t="inlineStr"><is><t>B000000001</t></is></c>'
+        '<c r="B2" t="d"><v>2024-01-02T00:00:00</v></c></row>'
+        '<row r="3"><c r="A3" t="inlineStr"><is><t>B000000002</t></is></c>'
+        '<c r="B3" t="inlineStr"><is><t>https://a.com/2</t></is></c></row>'
+    )])
+    assert list(engine.iter_asins_from_excel(path)) == ["B000000001", "B000000002"]
+    assert form_site.read_urls_from_excel(path) == ["https://a.com/2"]